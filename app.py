@@ -4,9 +4,19 @@ from dotenv import load_dotenv
 from routes.auth_routes import init_auth_routes
 from routes.user_routes import init_user_routes
 from routes.patient_routes import init_patient_routes
+from routes.analytics_routes import init_analytics_routes
+from routes.metrics_routes import init_metrics_routes
+from routes.diagnostics_routes import init_diagnostics_routes
 from utils.auth import get_current_user
 from datetime import datetime
 from seed_db import init_database, get_mongo_connection
+from utils.init_db import init_db_connection
+from utils.mongo_indexes import start_mongo_index_bootstrap
+from utils.risk_model import ensure_model, warm_model
+from utils.password_hashing import start_password_hashing
+from utils.metrics import init_metrics
+from utils.query_log import init_query_log
+from utils.profiler import init_profiler
 from flask_wtf import CSRFProtect
 
 load_dotenv()
@@ -16,9 +26,28 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY")
 csrf = CSRFProtect(app)
 
-init_database()
+# One SQLite connection per request, released at teardown
+init_db_connection(app)
+# Per-endpoint latency and query counts, served at /metrics
+init_metrics(app)
+# Every query with its call site when QUERY_DIAGNOSTICS is on
+init_query_log(app)
+# Profiles a single request on demand, see /diagnostics/profiles
+init_profiler(app)
 
 db, patient_assessments_collection, emergency_contact_coll = get_mongo_connection()
+
+# The production launcher (gunicorn.conf.py) does this once in the master
+# process before forking, so workers skip it
+if not os.environ.get("NEUROPREDICT_INITIALIZED"):
+    init_database()
+    start_mongo_index_bootstrap(patient_assessments_collection, emergency_contact_coll)
+    ensure_model()
+
+# Every process loads the risk model up front rather than on its first assessment
+warm_model()
+# Fork the password hashing workers before this process starts any request threads
+start_password_hashing()
  
  
 @app.context_processor
@@ -45,6 +74,9 @@ def format_date(date):
 init_auth_routes(app)
 init_user_routes(app)
 init_patient_routes(app, db, patient_assessments_collection, emergency_contact_coll)
+init_analytics_routes(app, patient_assessments_collection)
+init_metrics_routes(app)
+init_diagnostics_routes(app)
 
 
 @app.errorhandler(404)
@@ -1,42 +1,130 @@
-import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from faker import Faker
 
-def generate_fake_demographics(input_file="csv/healthcare_dataset_stroke_data.csv", nrows=1000):
+NAME_POOL_SIZE = 2000
+CHUNK_SIZE = 100_000
+# Each block of rows draws from its own seeded stream. Chunks are whole
+# blocks, so the output does not depend on the chunk size either
+SEED_BLOCK = 10_000
+
+
+def build_name_pools(seed=42, pool_size=NAME_POOL_SIZE):
+    """
+    Sample the Faker name pools once, instead of calling Faker for every row.
+    Returns a dict of numpy arrays: male, female, other (first names) and last.
+    """
     fake = Faker()
-    Faker.seed(42)
-    random.seed(42)
+    fake.seed_instance(seed)
+    return {
+        "male": np.array([fake.first_name_male() for _ in range(pool_size)]),
+        "female": np.array([fake.first_name_female() for _ in range(pool_size)]),
+        "other": np.array([fake.first_name() for _ in range(pool_size)]),
+        "last": np.array([fake.last_name() for _ in range(pool_size)]),
+    }
+
+
+def _draw_block(genders, pools, seed_seq):
+    """Draw names and emails for one block of genders."""
+    rng = np.random.default_rng(seed_seq)
+    size = len(genders)
+
+    genders = pd.Series(genders).astype(str).str.strip().str.lower().to_numpy()
+    first_names = np.where(
+        genders == "male", pools["male"][rng.integers(0, len(pools["male"]), size)],
+        np.where(
+            genders == "female", pools["female"][rng.integers(0, len(pools["female"]), size)],
+            pools["other"][rng.integers(0, len(pools["other"]), size)],
+        ),
+    )
+    last_names = pools["last"][rng.integers(0, len(pools["last"]), size)]
+    numbers = rng.integers(10, 10000, size)
+
+    emails = (
+        pd.Series(first_names).str.lower() + "." + pd.Series(last_names).str.lower()
+        + pd.Series(numbers).astype(str) + "@example.com"
+    )
+    return first_names, last_names, emails.to_numpy()
+
+
+def _generate_chunk(args):
+    """
+    Draw names and emails for one chunk of genders, block by block.
+    Runs in a worker process, so it only takes picklable arguments.
+    """
+    genders, pools, seed_seqs = args
+    blocks = [
+        _draw_block(genders[i * SEED_BLOCK:(i + 1) * SEED_BLOCK], pools, seed_seq)
+        for i, seed_seq in enumerate(seed_seqs)
+    ]
+    return tuple(np.concatenate([block[column] for block in blocks]) for column in range(3))
+
+
+def replicate_rows(df, size):
+    """
+    Repeat the dataset rows until there are `size` of them, for capacity tests.
+    Each repeat shifts the id past the original range so ids stay unique.
+    """
+    positions = np.arange(size)
+    id_span = int(df["id"].max()) + 1
+    repeat = positions // len(df)
 
+    df = df.iloc[positions % len(df)].reset_index(drop=True)
+    df["id"] = df["id"].to_numpy() + repeat * id_span
+    return df
+
+
+def generate_fake_demographics(input_file="csv/healthcare_dataset_stroke_data.csv", nrows=1000,
+                               seed=42, size=None, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Add fake first_name, last_name and email columns to the stroke dataset.
+
+    nrows limits the dataset rows read ("all" for every row). size replicates
+    those rows up to that many patients. Every SEED_BLOCK rows get their own
+    seed derived from `seed`, so the output is identical for a given seed
+    whatever the number of workers or the chunk size.
+    """
     df = pd.read_csv(input_file)
-    df = df.head(nrows)
-
-    first_names = []
-    last_names = []
-    emails = []
-
-    for g in df["gender"]:
-        g = str(g).strip().lower()
-        if g == "male":
-            first_name = fake.first_name_male()
-        elif g == "female":
-            first_name = fake.first_name_female()
-        else:
-            first_name = fake.first_name()
-        last_name = fake.last_name()
-        number = random.randint(10, 9999)
-        email = f"{first_name.lower()}.{last_name.lower()}{number}@example.com"
-        first_names.append(first_name)
-        last_names.append(last_name)
-        emails.append(email)
-
-    df["first_name"] = first_names
-    df["last_name"] = last_names
-    df["email"] = emails
+    # nrows="all" (or None) keeps every row of the dataset
+    if nrows is not None and str(nrows).lower() != "all":
+        df = df.head(int(nrows))
+
+    if size is not None and int(size) != len(df):
+        df = replicate_rows(df, int(size))
+
+    pools = build_name_pools(seed)
+    genders = df["gender"].to_numpy()
+    blocks_per_chunk = max(1, -(-chunk_size // SEED_BLOCK))
+    seed_seqs = np.random.SeedSequence(seed).spawn(max(1, -(-len(df) // SEED_BLOCK)))
+    tasks = [
+        (genders[i * SEED_BLOCK:(i + blocks_per_chunk) * SEED_BLOCK], pools, seed_seqs[i:i + blocks_per_chunk])
+        for i in range(0, len(seed_seqs), blocks_per_chunk)
+    ]
+    n_chunks = len(tasks)
+
+    if workers and workers > 1 and n_chunks > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_generate_chunk, tasks))
+    else:
+        results = [_generate_chunk(task) for task in tasks]
+
+    df["first_name"] = np.concatenate([r[0] for r in results])
+    df["last_name"] = np.concatenate([r[1] for r in results])
+    df["email"] = np.concatenate([r[2] for r in results])
     return df
 
 # If run as a script, create and save the fake demographics CSV
 if __name__ == "__main__":
-    output_file = "csv/healthcare_dataset_stroke_with_names.csv"
-    df = generate_fake_demographics()
-    df.to_csv(output_file, index=False)
-    print("Saved file with fake names/emails as:", output_file)
+    parser = argparse.ArgumentParser(description="Generate fake demographics for the stroke dataset.")
+    parser.add_argument("--nrows", default=1000, help='Dataset rows to use, or "all".')
+    parser.add_argument("--size", type=int, default=None, help="Replicate rows up to this many patients.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for chunk generation.")
+    parser.add_argument("--output", default="csv/healthcare_dataset_stroke_with_names.csv")
+    args = parser.parse_args()
+
+    df = generate_fake_demographics(nrows=args.nrows, seed=args.seed, size=args.size, workers=args.workers)
+    df.to_csv(args.output, index=False)
+    print("Saved file with fake names/emails as:", args.output)
@@ -0,0 +1,55 @@
+"""
+Production launcher settings, run with:
+
+    gunicorn app:app -c gunicorn.conf.py
+
+Schema creation, migrations, seeding and training the stroke risk model
+(if none is published yet) run once in the master process before any
+worker is forked. Workers then import the app themselves,
+so SQLite connections and the MongoClient are only created after fork.
+"""
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# Workers must import the app after fork, not share one from the master
+preload_app = False
+
+
+def on_starting(server):
+    """Initialize the databases once, before the workers are forked."""
+    from seed_db import init_database, get_mongo_connection
+    from utils.mongo_indexes import start_mongo_index_bootstrap
+    from utils.risk_model import ensure_model
+
+    init_database()
+    _, patient_assessments_collection, emergency_contact_coll = get_mongo_connection()
+    start_mongo_index_bootstrap(patient_assessments_collection, emergency_contact_coll)
+    ensure_model()
+
+    # Inherited by every worker, so app.py skips initialization there
+    os.environ["NEUROPREDICT_INITIALIZED"] = "1"
+
+
+def post_worker_init(worker):
+    """
+    Retire this worker if its password hashing pool breaks. It finishes the
+    requests in flight and the master forks a clean replacement.
+    """
+    from utils.password_hashing import set_broken_pool_handler
+
+    def retire():
+        worker.log.warning("Password hashing pool broke, restarting worker %s", worker.pid)
+        worker.alive = False
+
+    set_broken_pool_handler(retire)
@@ -1,28 +1,26 @@
-import sqlite3
-from utils.init_db import db_name
+from utils.init_db import db_connection
 
 def init_employee():
     """
     Create the employee table.
     """
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
-    
-    # Create the employee table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS employee (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        employee_id TEXT UNIQUE NOT NULL,
-        first_name TEXT NOT NULL,
-        last_name TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        role TEXT NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        # Create the employee table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS employee (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id TEXT UNIQUE NOT NULL,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            role TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        conn.commit()
 
 class Employee:
     """
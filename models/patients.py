@@ -1,5 +1,4 @@
-import sqlite3
-from utils.init_db import db_name
+from utils.init_db import db_connection
 
 def init_patients_demographics():
     """
@@ -7,24 +6,23 @@ def init_patients_demographics():
     Includes source_row_id to store CSV dataset origin
     or None for manually created patients.
     """
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS patients_demographics (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        first_name TEXT NOT NULL,
-        last_name TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        date_of_birth DATE NOT NULL,
-        gender TEXT NOT NULL,
-        source_row_id INTEGER,                     
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS patients_demographics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            date_of_birth DATE NOT NULL,
+            gender TEXT NOT NULL,
+            source_row_id INTEGER,                     
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        conn.commit()
     
 class Patient:
     """
@@ -1,5 +1,4 @@
-import sqlite3
-from utils.init_db import db_name
+from utils.init_db import db_connection
 from werkzeug.security import generate_password_hash, check_password_hash
 from constants.role_types import RoleTypes
 
@@ -7,30 +6,29 @@ def init_users():
     """
     Create the users table.
     """
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (    
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        employee_id TEXT UNIQUE NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        is_active BOOLEAN DEFAULT 1,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (employee_id) REFERENCES employee(employee_id)
-    )
-    ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (    
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (employee_id) REFERENCES employee(employee_id)
+        )
+        ''')
 
-    conn.commit()
-    conn.close()
+        conn.commit()
 
 class User:
     """
     A class to represent the user and perform user-related operations.
     """
-    def __init__(self, id, employee_id, email, first_name, last_name, password_hash=None, is_active=True):
+    def __init__(self, id, employee_id, email, first_name, last_name, password_hash=None, is_active=True, role=None):
         self.id = id
         self.employee_id = employee_id
         self.email = email
@@ -38,7 +36,7 @@ class User:
         self.is_active = bool(is_active)
         self.first_name = first_name
         self.last_name = last_name
-        self._role = None  # Cache for role from Employee table
+        self._role = role  # Cache for role from Employee table, None until loaded
         
    
     # Password management methods
@@ -56,13 +54,12 @@ class User:
         """
         if self._role is None:  # Only query the db if the role is not already cached
         
-            conn = sqlite3.connect(db_name())
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT role FROM employee WHERE employee_id = ?''', (self.employee_id,))
-            result = cursor.fetchone()
-            conn.close()
+            with db_connection() as conn:
+                cursor = conn.cursor()
+
+                cursor.execute('''
+                SELECT role FROM employee WHERE employee_id = ?''', (self.employee_id,))
+                result = cursor.fetchone()
         
             if result:
                 self._role = result[0]  # Cache the role
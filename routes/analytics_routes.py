@@ -0,0 +1,33 @@
+from flask import render_template, flash, jsonify
+from utils.decorators import auth_required, health_professionals_required
+from utils.analytics import get_population_analytics
+
+
+def init_analytics_routes(app, patient_assessments_collection=None):
+    @app.route("/analytics")
+    @auth_required
+    @health_professionals_required
+    def analytics():
+        try:
+            data = get_population_analytics(patient_assessments_collection)
+        except Exception as e:
+            flash(f'Failed to load analytics: {e}', 'error')
+            data = None
+
+        if data is None and patient_assessments_collection is None:
+            flash('Analytics need MongoDB, which is not configured.', 'warning')
+
+        return render_template('pages/analytics.html', analytics=data)
+
+    @app.route("/analytics/data")
+    @auth_required
+    @health_professionals_required
+    def analytics_data():
+        try:
+            data = get_population_analytics(patient_assessments_collection)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 503
+
+        if data is None:
+            return jsonify({"error": "MongoDB is not configured."}), 503
+        return jsonify(data)
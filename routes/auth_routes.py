@@ -1,9 +1,18 @@
 
-from flask import flash, render_template, request, redirect, session, url_for 
+from flask import flash, render_template, request, redirect, session, url_for, make_response
 from utils.auth import (
     handle_login, validate_registration_data,
     validate_credentials, create_user, clear_form_data
 )
+from utils.throttle import check_throttle
+
+
+def too_many_attempts(template, retry_after, **context):
+    """429 response with the form re-rendered, sent before any database or hashing work."""
+    flash(f'Too many attempts. Please try again in {retry_after} seconds.', 'error')
+    response = make_response(render_template(template, **context), 429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
 
 
 def init_auth_routes(app):
@@ -12,6 +21,10 @@ def init_auth_routes(app):
         if request.method == 'POST':
             email = request.form.get('email', '').strip()
             password = request.form.get('password', '').strip()
+
+            retry_after = check_throttle(('login_ip', request.remote_addr), ('login_email', email.lower()))
+            if retry_after:
+                return too_many_attempts('pages/auth/login.html', retry_after, email=email)
             
             if handle_login(email, password):
                 flash("Login successfully", "success")
@@ -24,6 +37,10 @@ def init_auth_routes(app):
     @app.route("/register", methods=['GET', 'POST'])
     def register():
         if request.method == 'POST': 
+            retry_after = check_throttle(('register_ip', request.remote_addr))
+            if retry_after:
+                return too_many_attempts('pages/auth/register.html', retry_after, form_data=clear_form_data())
+
             session['form_data'] = {
                 'employee_id': request.form.get('employee_id', '').strip(),
                 'email': request.form.get('email', '').strip()
@@ -0,0 +1,44 @@
+from flask import render_template, jsonify, flash, request, send_from_directory, abort
+from utils.decorators import auth_required, admin_required
+from utils.query_log import get_query_diagnostics
+from utils.profiler import PROFILE_PARAM, list_profiles, profile_dir, sign_profile_token
+
+
+def init_diagnostics_routes(app):
+    @app.route("/diagnostics/queries")
+    @auth_required
+    @admin_required
+    def query_diagnostics():
+        # Per process, each worker reports the queries it has served
+        return render_template('pages/query_diagnostics.html', diagnostics=get_query_diagnostics())
+
+    @app.route("/diagnostics/queries/data")
+    @auth_required
+    @admin_required
+    def query_diagnostics_data():
+        return jsonify(get_query_diagnostics())
+
+    @app.route("/diagnostics/profiles")
+    @auth_required
+    @admin_required
+    def profiles():
+        path = request.args.get("path", "").strip()
+        profile_link = None
+        if path:
+            if not path.startswith("/"):
+                flash("The page path must start with /, e.g. /users-management.", "error")
+            else:
+                try:
+                    profile_link = f"{path}?{PROFILE_PARAM}={sign_profile_token(path)}"
+                except ValueError as err:
+                    flash(str(err), "error")
+
+        return render_template('pages/profiles.html', profiles=list_profiles(), path=path, profile_link=profile_link)
+
+    @app.route("/diagnostics/profiles/<name>")
+    @auth_required
+    @admin_required
+    def download_profile(name):
+        if not name.endswith('.speedscope.json'):
+            abort(404)
+        return send_from_directory(profile_dir(), name, as_attachment=True)
@@ -0,0 +1,20 @@
+from flask import Response, request
+from utils.decorators import auth_required, admin_required
+from utils.metrics import render_metrics, metrics_token_ok
+
+
+def init_metrics_routes(app):
+    def metrics_response():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    @auth_required
+    @admin_required
+    def admin_metrics():
+        return metrics_response()
+
+    @app.route("/metrics")
+    def metrics():
+        # A Prometheus scraper can't log in, so it may send METRICS_TOKEN as a bearer token instead
+        if metrics_token_ok(request.headers.get('Authorization')):
+            return metrics_response()
+        return admin_metrics()
@@ -1,8 +1,14 @@
-from flask import render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, make_response, Response, jsonify, stream_with_context
 from utils.decorators import auth_required, admin_required, doctor_required, health_professionals_required, doctor_or_nurse_required
 from utils.patients import get_patients_statistics
-from utils.patients import(register_patient, validate_patient_data, validate_patient_assessment_data, update_patient, get_patient_by_id, get_all_patients, delete_patient, get_patient_assessments_history, validate_emergency_contact_data, get_patients_paginated)
+from utils.patients import(register_patient, validate_patient_data, validate_patient_assessment_data, update_patient, get_patient_by_id, get_all_patients, delete_patient, get_patient_assessments_page, validate_emergency_contact_data, get_patients_paginated, get_patients_by_cursor, search_patients)
 from bson import ObjectId
+from utils.patient_view import load_patient_detail
+from utils.patient_import import import_patients, detect_import_format
+from utils.patient_export import export_patients
+from utils.query_log import stream_with_query_log
+from utils.risk_model import score_assessment, get_model, age_from_dob, registry as risk_model_registry
+from datetime import datetime, timezone
 
 
 def init_patient_routes(app, db=None, patient_assessments_collection=None, emergency_contact_coll=None):
@@ -11,9 +17,42 @@ def init_patient_routes(app, db=None, patient_assessments_collection=None, emerg
     @health_professionals_required
     def patient_management():
         
-        page = request.args.get("page", default=1, type=int)
         per_page = 10 
 
+        # ?q= shows the best full-text matches instead of a page of patients
+        search_query = request.args.get("q", "").strip()
+        if search_query:
+            return render_template(
+                'pages/patient_management.html',
+                patients_overview=get_patients_statistics(patient_assessments_collection),
+                patients=search_patients(search_query),
+                search_query=search_query,
+                per_page=per_page,
+            )
+
+        # ?cursor= switches to keyset pagination, which stays fast on deep pages
+        if "cursor" in request.args:
+            try:
+                patients, next_cursor, prev_cursor, total_patients = get_patients_by_cursor(
+                    cursor=request.args.get("cursor"), per_page=per_page
+                )
+            except ValueError as err:
+                flash(str(err), 'error')
+                return redirect(url_for('patient_management'))
+
+            return render_template(
+                'pages/patient_management.html',
+                patients_overview=get_patients_statistics(patient_assessments_collection),
+                patients=patients,
+                cursor_mode=True,
+                next_cursor=next_cursor,
+                prev_cursor=prev_cursor,
+                total_count=total_patients,
+                per_page=per_page,
+            )
+
+        page = request.args.get("page", default=1, type=int)
+
         patients, total_pages = get_patients_paginated(page=page, per_page=per_page)
 
         return render_template(
@@ -27,6 +66,20 @@ def init_patient_routes(app, db=None, patient_assessments_collection=None, emerg
 
     
     
+    @app.route("/patient-management/search")
+    @auth_required
+    @health_professionals_required
+    def search_patients_route():
+        limit = max(1, min(request.args.get("limit", default=20, type=int), 100))
+        return jsonify(search_patients(request.args.get("q", ""), limit=limit))
+
+    @app.route("/risk-model/status")
+    @auth_required
+    @admin_required
+    def risk_model_status():
+        # Per process, each worker reports its own load and inference timings
+        return jsonify(risk_model_registry.stats())
+
     @app.route("/register-patient", methods=['GET', 'POST'])
     @auth_required
     @admin_required
@@ -51,24 +104,83 @@ def init_patient_routes(app, db=None, patient_assessments_collection=None, emerg
         
         # GET request - show registration form
         return render_template('pages/patient_management.html', patients_overview=get_patients_statistics(patient_assessments_collection), patients=get_all_patients())
-            
+
+    @app.route("/import-patients", methods=['POST'])
+    @auth_required
+    @admin_required
+    def import_patients_route():
+        upload = request.files.get('import_file')
+        try:
+            if upload is None or not upload.filename:
+                raise ValueError('Please choose a file to import.')
+            report = import_patients(upload.stream, detect_import_format(upload.filename))
+        except ValueError as err:
+            flash(str(err), 'error')
+            return redirect(url_for('patient_management'))
+
+        flash(f"Imported {report['inserted']} patients, {report['failed']} rows failed.",
+              'success' if not report['failed'] else 'warning')
+
+        per_page = 10
+        patients, total_pages = get_patients_paginated(page=1, per_page=per_page)
+        return render_template(
+            'pages/patient_management.html',
+            patients_overview=get_patients_statistics(patient_assessments_collection),
+            patients=patients,
+            page=1,
+            total_pages=total_pages,
+            per_page=per_page,
+            import_report=report,
+        )
+
+    @app.route("/export-patients")
+    @auth_required
+    @admin_required
+    def export_patients_route():
+        export_format = request.args.get("format", "csv")
+        try:
+            chunks = export_patients(patient_assessments_collection, export_format)
+        except ValueError as err:
+            flash(str(err), 'error')
+            return redirect(url_for('patient_management'))
+
+        # No Content-Length, so the body is sent chunked as batches are produced.
+        # The export's queries are logged with this request once the last chunk is sent.
+        mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        return Response(stream_with_context(stream_with_query_log(chunks)), mimetype=mimetype, headers={
+            "Content-Disposition": f"attachment; filename=patients.{export_format}",
+        })
+
     @app.route("/patient-management/patient/<int:patient_id>")
     @auth_required
     @doctor_or_nurse_required
     def patient_info(patient_id):
-        patient = get_patient_by_id(patient_id)
-        if not patient:
+        # Patient, assessments and emergency contacts are loaded concurrently
+        try:
+            detail = load_patient_detail(
+                patient_id, patient_assessments_collection, emergency_contact_coll,
+                assessments_cursor=request.args.get("assessments_cursor")
+            )
+        except ValueError as err:
+            flash(str(err), "error")
+            return redirect(url_for('patient_info', patient_id=patient_id))
+
+        if not detail["patient"]:
             flash("Patient not found.", "error")
             return redirect(url_for('patient_management'))
         
-        assessments = get_patient_assessments_history(patient_assessments_collection, patient_id)
-        
-        # Get emergency contacts for this patient
-        emergency_contacts = []
-        if emergency_contact_coll is not None:
-            emergency_contacts = list(emergency_contact_coll.find({"patient_id": patient_id}))
-        
-        return render_template('pages/patient_info.html', patient=patient, assessments=assessments, emergency_contacts=emergency_contacts)
+        response = make_response(render_template(
+            'pages/patient_info.html',
+            patient=detail["patient"],
+            assessments=detail["assessments"],
+            next_assessments_cursor=detail["next_assessments_cursor"],
+            emergency_contacts=detail["emergency_contacts"],
+        ))
+        # Per-source timings, visible in the browser dev tools
+        response.headers["Server-Timing"] = ", ".join(
+            f"{source};dur={ms:.1f}" for source, ms in detail["timings"].items()
+        )
+        return response
     
     
     @app.route("/patient-management/patient/<int:patient_id>/update", methods=['GET', 'POST'])
@@ -133,7 +245,7 @@ def init_patient_routes(app, db=None, patient_assessments_collection=None, emerg
                 residence_type=residence_type,
                 avg_glucose_level=float(avg_glucose_level) if avg_glucose_level else 0,
                 hypertensiv_status=hypertensiv_status,
-                bmi=float(bmi) if bmi else 0,
+                bmi=float(bmi) if bmi else None,
                 smoking_status=smoking_status,
                 stroke_status=stroke_status
             )
@@ -149,9 +261,20 @@ def init_patient_routes(app, db=None, patient_assessments_collection=None, emerg
             new_assessment = {
                 "patient_id": int(patient_id),
                 "source_row_id": source_row_id,
+                "date": datetime.now(timezone.utc),
                 **result
             }
 
+            # A scoring failure should not lose the assessment, it can be rescored later
+            try:
+                model = get_model()
+                new_assessment["risk_score"] = score_assessment(
+                    result, age_from_dob(patient.date_of_birth), patient.gender, model
+                )
+                new_assessment["risk_model_version"] = model['version']
+            except Exception as e:
+                print(f"Stroke risk scoring failed: {e}")
+
             if patient_assessments_collection is not None:
                 patient_assessments_collection.insert_one(new_assessment)
             flash('Patient assessment recorded successfully!', 'success')
@@ -160,10 +283,11 @@ def init_patient_routes(app, db=None, patient_assessments_collection=None, emerg
         except ValueError as err:
             flash(str(err), 'error')
             # Return to the page with form data preserved
-            assessments = get_patient_assessments_history(patient_assessments_collection, patient_id)
+            assessments, next_assessments_cursor = get_patient_assessments_page(patient_assessments_collection, patient_id)
             return render_template('pages/patient_info.html', 
                                  patient=patient, 
                                  assessments=assessments,
+                                 next_assessments_cursor=next_assessments_cursor,
                                  form_data={
                                      'work_type': work_type,
                                      'ever_married': ever_married,
@@ -176,10 +300,11 @@ def init_patient_routes(app, db=None, patient_assessments_collection=None, emerg
                                  })
         except Exception as e:
             flash(f'Failed to save assessment: {str(e)}', 'error')
-            assessments = get_patient_assessments_history(patient_assessments_collection, patient_id)
+            assessments, next_assessments_cursor = get_patient_assessments_page(patient_assessments_collection, patient_id)
             return render_template('pages/patient_info.html', 
                                  patient=patient, 
                                  assessments=assessments,
+                                 next_assessments_cursor=next_assessments_cursor,
                                  form_data={
                                      'work_type': work_type,
                                      'ever_married': ever_married,
@@ -1,14 +1,35 @@
 from flask import render_template, flash, redirect, url_for, request
 from utils.decorators import admin_required
-from utils.users import get_users_overview, get_all_users, get_user_count, deactivate_user, activate_user, get_users_paginated
+from utils.users import get_users_overview, get_user_count, deactivate_user, activate_user, get_users_paginated, get_users_by_cursor
 
 def init_user_routes(app):
     @app.route("/users-management")
     @admin_required
     def users_management():
-        page = request.args.get("page", default=1, type=int)
         per_page = 10
 
+        # ?cursor= switches to keyset pagination, which stays fast on deep pages
+        if "cursor" in request.args:
+            try:
+                users, next_cursor, prev_cursor, total_users = get_users_by_cursor(
+                    cursor=request.args.get("cursor"), per_page=per_page
+                )
+            except ValueError as err:
+                flash(str(err), "error")
+                return redirect(url_for('users_management'))
+
+            return render_template('pages/users_management.html',
+                                user_count=total_users,
+                                users=users,
+                                users_overview=get_users_overview(),
+                                cursor_mode=True,
+                                next_cursor=next_cursor,
+                                prev_cursor=prev_cursor,
+                                total_count=total_users,
+                                per_page=per_page)
+
+        page = request.args.get("page", default=1, type=int)
+
         users, total_pages = get_users_paginated(page=page, per_page=per_page)
         total_users = get_user_count()
         users_overview = get_users_overview()
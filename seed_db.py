@@ -1,18 +1,22 @@
 
+import argparse
 import csv
 import os
 import sqlite3
-from datetime import datetime, date
-import random
+import time
+from datetime import datetime, timezone
+import numpy as np
 import pandas as pd
 from models.users import init_users
 from models.roles import init_roles
 from models.patients import init_patients_demographics
 from models.employee import init_employee
-from utils.init_db import db_name
-from pymongo import MongoClient
+from utils.init_db import db_name, get_db_connection, configure_database
+from pymongo.errors import BulkWriteError
+from utils.mongo import mongo_configured, get_mongo_db, LazyCollection
 from dotenv import load_dotenv
 from gen_fake_demographs import generate_fake_demographics
+from utils.migrations import run_migrations
 
 load_dotenv()
 
@@ -21,15 +25,19 @@ load_dotenv()
 def get_mongo_connection():
     """
     Get MongoDB connection
-    Returns db and collections if successful, else None.
+    Returns db and collections backed by the shared lazy client,
+    or None if MongoDB is not configured.
     """
+    if not mongo_configured():
+        print("MongoDB not configured, MongoDB-backed features are disabled.")
+        return None, None, None
+
     try:
-        client = MongoClient(os.environ.get("MONGODB_URI"))
-        db = client[os.environ.get("MONGODB_NAME")]
-        patient_assessments_collection = db[os.environ.get("MONGODB_PATIENT_ASSESSMENTS_COLLECTION")]
-        emergency_contact_coll = db[os.environ.get("MONGODB_EMERGENCY_CONTACT_COLL")]
+        db = get_mongo_db()
+        patient_assessments_collection = LazyCollection("MONGODB_PATIENT_ASSESSMENTS_COLLECTION")
+        emergency_contact_coll = LazyCollection("MONGODB_EMERGENCY_CONTACT_COLL")
 
-        print("Connected to MongoDB")
+        print("MongoDB client configured (connects on first use)")
         return db, patient_assessments_collection, emergency_contact_coll
 
     except Exception as e:
@@ -37,15 +45,115 @@ def get_mongo_connection():
         return None, None, None
 
 
-def dob_from_age(age: float) -> str:
+def dobs_from_ages(ages, seed=42):
     """
-    Rough DOB estimate based on age.
-    
-    Returns ISO format date string."""
-    year = datetime.now().year - int(age)
-    month = random.randint(1, 12)
-    day = random.randint(1, 28)
-    return date(year, month, day).isoformat()
+    Rough DOB estimates based on a Series of ages.
+
+    Returns a list of ISO format date strings."""
+    rng = np.random.default_rng(seed)
+    dates = pd.DataFrame({
+        "year": datetime.now().year - ages.astype(int).to_numpy(),
+        "month": rng.integers(1, 13, len(ages)),
+        "day": rng.integers(1, 29, len(ages)),
+    })
+    return pd.to_datetime(dates).dt.strftime("%Y-%m-%d").tolist()
+
+
+MONGO_BATCH_SIZE = 1000
+
+def seed_patients(cursor, patient_assessments_collection, df):
+    """
+    Bulk insert patient demographics into SQLite and their assessments into MongoDB.
+    Duplicates are filtered in pandas against pre-fetched keys instead of
+    one lookup per row. The caller commits the SQLite transaction.
+
+    Returns (sqlite_inserted, skipped, mongo_inserted).
+    """
+    df = df.assign(source_row_id=df["id"].astype(int))  # original dataset row id
+
+    # SQLite: skip patients that already exist by email or source_row_id
+    cursor.execute("SELECT email, source_row_id FROM patients_demographics")
+    existing = cursor.fetchall()
+    existing_emails = {r[0] for r in existing}
+    existing_source_ids = {r[1] for r in existing if r[1] is not None}
+
+    is_duplicate = (
+        df["email"].isin(existing_emails)
+        | df["source_row_id"].isin(existing_source_ids)
+        | df["email"].duplicated()
+    )
+    new_patients = df.loc[~is_duplicate, ["first_name", "last_name", "email", "gender", "source_row_id"]]
+    new_patients = new_patients.assign(date_of_birth=dobs_from_ages(df.loc[~is_duplicate, "age"]))
+
+    cursor.executemany(
+        """
+        INSERT INTO patients_demographics
+            (first_name, last_name, email, date_of_birth, gender, source_row_id)
+        VALUES (:first_name, :last_name, :email, :date_of_birth, :gender, :source_row_id)
+        """,
+        new_patients.to_dict("records"),
+    )
+    sqlite_inserted = len(new_patients)
+    skipped = int(is_duplicate.sum())
+
+    if patient_assessments_collection is None:
+        print("MongoDB unavailable, skipping assessments.")
+        return sqlite_inserted, skipped, 0
+
+    # Resolve every row to its patient id (new or existing) in one query
+    cursor.execute("SELECT id, email, source_row_id FROM patients_demographics")
+    ids_by_source = {}
+    ids_by_email = {}
+    for patient_id, email, source_row_id in cursor.fetchall():
+        ids_by_email[email] = patient_id
+        if source_row_id is not None:
+            ids_by_source[source_row_id] = patient_id
+    patient_ids = df["source_row_id"].map(ids_by_source).fillna(df["email"].map(ids_by_email))
+
+    # MongoDB: skip assessments that already exist for a source_row_id
+    existing_assessments = {
+        doc["source_row_id"]
+        for doc in patient_assessments_collection.find(
+            {"source_row_id": {"$ne": None}}, {"source_row_id": 1, "_id": 0}
+        )
+    }
+    pending = df[~df["source_row_id"].isin(existing_assessments) & patient_ids.notna()]
+    pending = pending.drop_duplicates("source_row_id")
+
+    bmi = pd.to_numeric(pending["bmi"], errors="coerce")
+    # The dataset has no dates, so seeded assessments are dated when they are
+    # recorded, like assessments entered through the form
+    recorded_at = datetime.now(timezone.utc)
+    assessment_docs = pd.DataFrame({
+        "patient_id": patient_ids[pending.index].astype(int),
+        "source_row_id": pending["source_row_id"],
+        "date": recorded_at,
+
+        "work_type": pending["work_type"],
+        "ever_married": pending["ever_married"],
+        "residence_type": pending["Residence_type"],
+        "avg_glucose_level": pending["avg_glucose_level"].astype(float),
+        "hypertensiv_status": pending["hypertension"].astype(int),
+        "bmi": bmi.astype(object).where(bmi.notna(), None),
+        "smoking_status": pending["smoking_status"],
+        "stroke_status": pending["stroke"],
+    }).to_dict("records")
+
+    # Unordered batches so one bad document does not stop the rest
+    mongo_inserted = 0
+    for start in range(0, len(assessment_docs), MONGO_BATCH_SIZE):
+        try:
+            result = patient_assessments_collection.insert_many(
+                assessment_docs[start:start + MONGO_BATCH_SIZE], ordered=False
+            )
+            mongo_inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            # The rest of the batch was still written, count it and carry on
+            mongo_inserted += e.details["nInserted"]
+            for error in e.details["writeErrors"]:
+                print(f"Skipped assessment {start + error['index']}: {error['errmsg']}")
+
+    return sqlite_inserted, skipped, mongo_inserted
 
 # RESET DATABASE
 
@@ -58,7 +166,11 @@ def delete_database():
     cursor.execute("DROP TABLE IF EXISTS users")
     cursor.execute("DROP TABLE IF EXISTS employee")
     cursor.execute("DROP TABLE IF EXISTS roles")
+    cursor.execute("DROP TABLE IF EXISTS patients_fts")
+    cursor.execute("DROP VIEW IF EXISTS patients_search")
     cursor.execute("DROP TABLE IF EXISTS patients_demographics")
+    cursor.execute("DROP TABLE IF EXISTS schema_migrations")
+    cursor.execute("DROP TABLE IF EXISTS table_counters")
 
     conn.commit()
     conn.close()
@@ -67,19 +179,27 @@ def delete_database():
 
 #  INIT DATABASE
 
-def init_database():
+def init_database(nrows=None):
     """
     Initialize database tables and seed initial data.
     Only runs full seeding once - checks for flag file.
+    nrows limits how many dataset rows are seeded ("all" for every row),
+    defaulting to the SEED_NROWS environment variable or 1000.
     """
     # Check if database has already been seeded
     seed_flag_file = os.path.join('instance', '.db_seeded')
+
+    # WAL + pragmas so writes don't block dashboard reads
+    configure_database()
     
     # Always create tables (in case they don't exist)
     init_roles()
     init_employee()
     init_users()
     init_patients_demographics()
+
+    # Bring indexes and later schema changes up to date
+    run_migrations()
     
     # Check if already seeded
     if os.path.exists(seed_flag_file):
@@ -89,7 +209,7 @@ def init_database():
     print("Seeding database with initial data...")
 
     # SQLITE CONNECTION 
-    conn = sqlite3.connect(db_name())
+    conn = get_db_connection()
     cursor = conn.cursor()
 
     #  MONGO CONNECTION
@@ -134,77 +254,17 @@ def init_database():
     print("\n Seeding patient demographics + assessments from CSV...")
 
     # Use in-memory fake demographics instead of reading from CSV
-    df = generate_fake_demographics()
-
-    sqlite_inserted = 0
-    mongo_inserted = 0
-    skipped = 0
-
-    for _, row in df.iterrows():
-        csv_source_id = int(row["id"])  # original dataset row id
-
-        # SQLite Insert
-        first_name = row["first_name"]
-        last_name = row["last_name"]
-        email = row["email"]
-        gender = row["gender"]
-        age = row["age"]
-        date_of_birth = dob_from_age(age)
-
-        # Check if patient already exists by email or source_row_id
-        cursor.execute(
-            "SELECT id FROM patients_demographics WHERE email = ? OR source_row_id = ?",
-            (email, csv_source_id)
-        )
-        existing = cursor.fetchone()
-
-        if existing:
-            patient_id = existing[0]
-            skipped += 1
-        else:
-            cursor.execute(
-                """
-                INSERT INTO patients_demographics
-                    (first_name, last_name, email, date_of_birth, gender, source_row_id)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (first_name, last_name, email, date_of_birth, gender, csv_source_id),
-            )
-
-            patient_id = cursor.lastrowid
-            sqlite_inserted += 1
-
-        # Mongo Insert check if assessment already exists for this source_row_id
-        existing_assessment = patient_assessments_collection.find_one({
-            "source_row_id": csv_source_id
-        })
-
-        if not existing_assessment:
-            bmi = row.get("bmi")
-            bmi_clean = None if pd.isna(bmi) else float(bmi)
-
-            assessment_doc = {
-                "patient_id": patient_id,
-                "source_row_id": csv_source_id,
-
-                "work_type": row.get("work_type"),
-                "ever_married": row.get("ever_married"),
-                "residence_type": row.get("Residence_type"),
-                "avg_glucose_level": float(row["avg_glucose_level"]),
-                "hypertensiv_status": int(row["hypertension"]),
-                "bmi": bmi_clean,
-                "smoking_status": row.get("smoking_status"),
-                "stroke_status": row.get("stroke"),
-            }
-
-            patient_assessments_collection.insert_one(assessment_doc)
-            mongo_inserted += 1
+    if nrows is None:
+        nrows = os.environ.get("SEED_NROWS", 1000)
+    df = generate_fake_demographics(nrows=nrows)
 
+    started = time.perf_counter()
+    sqlite_inserted, skipped, mongo_inserted = seed_patients(cursor, patient_assessments_collection, df)
+    elapsed = time.perf_counter() - started
 
     print(f"SQLite: {sqlite_inserted} patients inserted, {skipped} duplicates skipped.")
     print(f"MongoDB: {mongo_inserted} assessments inserted.")
-
-
+    print(f"Seeded {len(df)} rows in {elapsed:.2f}s ({len(df) / max(elapsed, 1e-9):.0f} rows/s).")
 
     conn.commit()
     conn.close()
@@ -219,4 +279,8 @@ def init_database():
 
 
 if __name__ == '__main__':
-    init_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Initialize and seed the NeuroPredict databases.")
+    parser.add_argument("--nrows", default=None, help='Number of dataset rows to seed, or "all".')
+    args = parser.parse_args()
+
+    init_database(nrows=args.nrows)
\ No newline at end of file
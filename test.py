@@ -2,6 +2,43 @@ import unittest
 from app import app
 import sqlite3
 import os
+import csv
+import io
+import json
+import runpy
+import subprocess
+import sys
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from unittest import mock
+from werkzeug.security import generate_password_hash
+import utils.init_db
+import utils.mongo
+import utils.throttle
+import utils.query_log
+from models.roles import init_roles
+from models.employee import init_employee
+from models.users import init_users
+from models.patients import init_patients_demographics
+from utils.init_db import get_db_connection
+from utils.migrations import MIGRATIONS, run_migrations, get_schema_version
+from utils.patients import get_patients_by_cursor, search_patients, build_search_query, SEARCH_CANDIDATES, validate_patient_assessment_data
+from utils.risk_model import train_model, score_assessment, NUMERIC_FEATURES
+from utils.profiler import sign_profile_token, verify_profile_token
+from utils.model_registry import ModelRegistry
+from utils.analytics import compute_population_analytics
+import utils.password_hashing
+from utils.users import get_user_count
+from utils.patient_import import import_patients, validate_patient_frame, DUPLICATE_EMAIL_ERROR
+from utils.patient_export import export_patients
+from pymongo.errors import BulkWriteError
+from gen_fake_demographs import generate_fake_demographics
+import seed_db
+from utils.mongo_indexes import init_mongo_indexes, ASSESSMENT_INDEXES, EMERGENCY_CONTACT_INDEXES
 
 def create_database():
         db_name = 'test_database.db'
@@ -75,6 +112,737 @@ class NeuroPredictTest(unittest.TestCase):
 
 
 
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Runs each test against a fresh, unseeded database in a temporary
+    directory, with the schema and every migration applied.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.original_db_path = utils.init_db.DB_PATH
+        utils.init_db.DB_PATH = os.path.join(self.tmp_dir, 'test.db')
+
+        init_roles()
+        init_employee()
+        init_users()
+        init_patients_demographics()
+        run_migrations()
+
+        app.testing = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client()
+
+    def tearDown(self):
+        utils.init_db.DB_PATH = self.original_db_path
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def execute(self, sql, params=()):
+        conn = get_db_connection()
+        try:
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def query(self, sql, params=()):
+        conn = get_db_connection()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def add_patient(self, first_name='Ada', last_name='Lovelace', email=None, date_of_birth='1960-05-01', gender='female'):
+        email = email or f'{first_name}.{last_name}@example.com'.lower()
+        return self.execute('''
+        INSERT INTO patients_demographics (first_name, last_name, email, date_of_birth, gender)
+        VALUES (?, ?, ?, ?, ?)
+        ''', (first_name, last_name, email, date_of_birth, gender))
+
+    def add_user(self, employee_id='EMP900', role='doctor', is_active=1):
+        self.execute('''
+        INSERT INTO employee (employee_id, first_name, last_name, email, role) VALUES (?, ?, ?, ?, ?)
+        ''', (employee_id, 'Test', role.title(), f'{employee_id.lower()}@neuropredict.com', role))
+        return self.execute('''
+        INSERT INTO users (employee_id, email, password_hash, is_active) VALUES (?, ?, ?, ?)
+        ''', (employee_id, f'{employee_id.lower()}@neuropredict.com', 'unused', is_active))
+
+    def login_as(self, user_id):
+        with self.client.session_transaction() as session:
+            session['user_id'] = user_id
+
+
+class KeysetPaginationTest(DatabaseTestCase):
+    def test_cursor_round_trip(self):
+        # Same created_at second for every row, so pages rely on the id tie-break
+        ids = [self.add_patient(first_name=f'Patient{n}', last_name='Test') for n in range(5)]
+        newest_first = list(reversed(ids))
+
+        pages = []
+        patients, next_cursor, prev_cursor, _ = get_patients_by_cursor(per_page=2)
+        self.assertIsNone(prev_cursor)
+        pages.append([p['id'] for p in patients])
+        while next_cursor:
+            patients, next_cursor, prev_cursor, _ = get_patients_by_cursor(cursor=next_cursor, per_page=2)
+            pages.append([p['id'] for p in patients])
+        self.assertEqual(pages, [newest_first[0:2], newest_first[2:4], newest_first[4:]])
+
+        back = []
+        while prev_cursor:
+            patients, _, prev_cursor, _ = get_patients_by_cursor(cursor=prev_cursor, per_page=2)
+            back.append([p['id'] for p in patients])
+        self.assertEqual(back, [newest_first[2:4], newest_first[0:2]])
+
+    def test_invalid_cursor_is_rejected(self):
+        with self.assertRaises(ValueError):
+            get_patients_by_cursor(cursor='not-a-cursor', per_page=2)
+
+
+class MigrationsTest(DatabaseTestCase):
+    def test_migrations_run_once(self):
+        # setUp already applied every migration
+        self.add_patient()
+        self.assertEqual(run_migrations(), 0)
+        self.assertEqual(run_migrations(), 0)
+
+        versions = [row[0] for row in self.query("SELECT version FROM schema_migrations ORDER BY version")]
+        self.assertEqual(versions, [version for version, _, _ in MIGRATIONS])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM patients_demographics"), [(1,)])
+
+    def test_only_missing_migrations_are_applied(self):
+        self.execute("DELETE FROM schema_migrations WHERE version = ?", (MIGRATIONS[-1][0],))
+        self.assertEqual(run_migrations(), 1)
+        self.assertEqual(get_schema_version(), MIGRATIONS[-1][0])
+
+
+class FakeCollection:
+    """
+    Just enough of a pymongo collection for the seeder. Documents at
+    reject_indexes within each insert_many batch fail like duplicate keys.
+    """
+    def __init__(self, reject_indexes=()):
+        self.docs = []
+        self.reject_indexes = set(reject_indexes)
+
+    def find(self, filter=None, projection=None):
+        return [dict(doc) for doc in self.docs]
+
+    def insert_many(self, docs, ordered=True):
+        kept = [doc for i, doc in enumerate(docs) if i not in self.reject_indexes]
+        self.docs.extend(kept)
+        errors = [{'index': i, 'code': 11000, 'errmsg': 'E11000 duplicate key'}
+                  for i in sorted(self.reject_indexes) if i < len(docs)]
+        if errors:
+            raise BulkWriteError({'nInserted': len(kept), 'writeErrors': errors})
+        return mock.Mock(inserted_ids=[object() for _ in kept])
+
+
+class SeedPatientsTest(DatabaseTestCase):
+    def seed(self, collection, df):
+        conn = get_db_connection()
+        try:
+            counts = seed_db.seed_patients(conn.cursor(), collection, df)
+            conn.commit()
+            return counts
+        finally:
+            conn.close()
+
+    def test_seed_counts_and_reseeding_skips_every_row(self):
+        df = generate_fake_demographics(nrows=30)
+        collection = FakeCollection()
+
+        self.assertEqual(self.seed(collection, df), (30, 0, 30))
+        self.assertEqual(self.query("SELECT COUNT(*) FROM patients_demographics"), [(30,)])
+        self.assertEqual(self.seed(collection, df), (0, 30, 0))
+        self.assertEqual(len(collection.docs), 30)
+
+    def test_rejected_assessments_do_not_stop_the_seed(self):
+        collection = FakeCollection(reject_indexes={0})
+        with mock.patch.object(seed_db, 'MONGO_BATCH_SIZE', 10):
+            _, _, mongo_inserted = self.seed(collection, generate_fake_demographics(nrows=25))
+
+        # One document rejected in each of the three batches
+        self.assertEqual(mongo_inserted, 22)
+        self.assertEqual(len(collection.docs), 22)
+
+
+class FakeDemographicsTest(unittest.TestCase):
+    def test_same_seed_gives_same_output_for_any_workers_and_chunks(self):
+        # Replicated past a few seed blocks, so chunks and workers really differ
+        size = 35000
+        expected = generate_fake_demographics(nrows='all', size=size, seed=7)
+
+        for workers, chunk_size in ((1, 10000), (3, 10000), (2, 25000), (4, 1)):
+            df = generate_fake_demographics(nrows='all', size=size, seed=7, workers=workers, chunk_size=chunk_size)
+            pd.testing.assert_frame_equal(df, expected)
+
+        self.assertEqual(df['id'].nunique(), size)
+        self.assertFalse(generate_fake_demographics(nrows='all', size=size, seed=8)['email'].equals(expected['email']))
+
+
+class TableCountersTest(DatabaseTestCase):
+    def counters(self):
+        return dict(self.query("SELECT name, value FROM table_counters"))
+
+    def test_counters_follow_inserts_deletes_and_updates(self):
+        patient_id = self.add_patient()
+        self.add_patient(first_name='Grace', last_name='Hopper')
+        user_id = self.add_user(employee_id='EMP901')
+        self.add_user(employee_id='EMP902', is_active=0)
+        self.assertEqual(self.counters(), {'patients': 2, 'users': 2, 'active_users': 1})
+
+        self.execute("UPDATE users SET is_active = 0 WHERE id = ?", (user_id,))
+        self.execute("UPDATE patients_demographics SET first_name = 'Augusta' WHERE id = ?", (patient_id,))
+        self.assertEqual(self.counters(), {'patients': 2, 'users': 2, 'active_users': 0})
+
+        self.execute("DELETE FROM patients_demographics WHERE id = ?", (patient_id,))
+        self.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        self.assertEqual(self.counters(), {'patients': 1, 'users': 1, 'active_users': 0})
+
+    def test_listing_totals_come_from_counters(self):
+        self.add_patient()
+        self.add_user()
+        _, _, _, total_patients = get_patients_by_cursor(per_page=10)
+        self.assertEqual(total_patients, 1)
+
+        self.add_patient(first_name='Grace', last_name='Hopper')
+        self.add_user(employee_id='EMP901')
+        _, _, _, total_patients = get_patients_by_cursor(per_page=10)
+        self.assertEqual(total_patients, 2)
+        self.assertEqual(get_user_count(), 2)
+
+
+class MongoIndexBootstrapTest(unittest.TestCase):
+    INDEXED = {'queryPlanner': {'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}}}
+    SCANNED = {'queryPlanner': {'winningPlan': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}}}
+
+    def test_creates_indexes_and_reports_collection_scans(self):
+        assessments = mock.MagicMock()
+        assessments.find.return_value.sort.return_value.explain.return_value = self.INDEXED
+        assessments.find.return_value.explain.return_value = self.INDEXED
+        assessments.index_information.return_value = {'_id_': {}, 'patient_id_date': {}}
+        contacts = mock.MagicMock()
+        contacts.find.return_value.explain.return_value = self.SCANNED
+
+        scans = init_mongo_indexes(assessments, contacts)
+
+        assessments.create_indexes.assert_called_once_with(ASSESSMENT_INDEXES)
+        contacts.create_indexes.assert_called_once_with(EMERGENCY_CONTACT_INDEXES)
+        assessments.drop_index.assert_called_once_with('patient_id_date')
+        self.assertEqual(scans, ['emergency contacts by patient_id'])
+
+    def test_skipped_without_mongo(self):
+        self.assertEqual(init_mongo_indexes(None, None), [])
+
+
+class MongoClientTest(unittest.TestCase):
+    def setUp(self):
+        for patcher in (
+            mock.patch.dict(os.environ, {'MONGODB_URI': 'mongodb://localhost:27999', 'MONGODB_NAME': 'test'}),
+            mock.patch.object(utils.mongo, '_client', None),
+            mock.patch.object(utils.mongo, '_client_pid', None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        if utils.mongo._client is not None:
+            utils.mongo._client.close()
+
+    def test_client_is_created_once_per_process(self):
+        client = utils.mongo.get_mongo_client()
+        self.assertIs(utils.mongo.get_mongo_client(), client)
+        self.assertEqual(client.options.pool_options.max_pool_size, 50)
+
+    def test_forked_child_gets_its_own_client(self):
+        parent_client = utils.mongo.get_mongo_client()
+        read_fd, write_fd = os.pipe()
+
+        pid = os.fork()
+        if pid == 0:
+            ok = utils.mongo._client is None and utils.mongo.get_mongo_client() is not parent_client
+            os.write(write_fd, b'1' if ok else b'0')
+            os._exit(0)
+
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        self.assertEqual(os.read(read_fd, 1), b'1')
+        os.close(read_fd)
+        self.assertIs(utils.mongo.get_mongo_client(), parent_client)
+
+
+class PatientPageTest(DatabaseTestCase):
+    def test_patient_page_renders(self):
+        patient_id = self.add_patient()
+        self.login_as(self.add_user(role='doctor'))
+
+        response = self.client.get(f'/patient-management/patient/{patient_id}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Lovelace', response.data)
+        self.assertIn('patient;dur=', response.headers['Server-Timing'])
+
+
+class GunicornLauncherTest(unittest.TestCase):
+    ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+    def test_master_initializes_once(self):
+        config = runpy.run_path(os.path.join(self.ROOT_DIR, 'gunicorn.conf.py'))
+
+        with mock.patch('seed_db.init_database') as init_database, \
+                mock.patch('seed_db.get_mongo_connection', return_value=(None, None, None)), \
+                mock.patch('utils.mongo_indexes.start_mongo_index_bootstrap') as start_bootstrap, \
+                mock.patch.dict(os.environ):
+            os.environ.pop('NEUROPREDICT_INITIALIZED', None)
+            config['on_starting'](None)
+            self.assertEqual(os.environ['NEUROPREDICT_INITIALIZED'], '1')
+
+        init_database.assert_called_once_with()
+        start_bootstrap.assert_called_once_with(None, None)
+
+    def test_workers_skip_initialization(self):
+        # A worker imports the app with the flag the master set
+        code = (
+            "import seed_db\n"
+            "def fail():\n"
+            "    raise SystemExit('init_database ran in a worker')\n"
+            "seed_db.init_database = fail\n"
+            "import app\n"
+        )
+        env = {**os.environ, 'NEUROPREDICT_INITIALIZED': '1'}
+        result = subprocess.run([sys.executable, '-c', code], cwd=self.ROOT_DIR, env=env,
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+class PatientImportTest(DatabaseTestCase):
+    CSV = (
+        "first_name,last_name,email,date_of_birth,gender\n"
+        "Ada,Lovelace,ada@example.com,1960-05-01,Female\n"
+        "Bad,Email,not-an-email,1960-05-01,female\n"
+        "Bad,Date,bad.date@example.com,01/05/1960,female\n"
+        "Too,Old,old@example.com,1850-01-01,male\n"
+        ",Missing,missing@example.com,1960-05-01,male\n"
+        "Bad,Gender,gender@example.com,1960-05-01,unknown\n"
+        "Ada,Again,ada@example.com,1961-05-01,female\n"
+    )
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        report = import_patients(io.BytesIO(self.CSV.encode()), 'csv', chunk_size=3)
+
+        self.assertEqual(report['inserted'], 1)
+        self.assertEqual(report['failed'], 6)
+        self.assertEqual([e['row'] for e in report['errors']], [2, 3, 4, 5, 6, 7])
+        self.assertEqual(report['errors'][-1]['error'], DUPLICATE_EMAIL_ERROR)
+        self.assertEqual(self.query("SELECT email, gender FROM patients_demographics"), [('ada@example.com', 'female')])
+
+    def test_parquet_import(self):
+        buffer = io.BytesIO()
+        pd.read_csv(io.StringIO(self.CSV), dtype=str).head(2).to_parquet(buffer)
+        buffer.seek(0)
+
+        report = import_patients(buffer, 'parquet')
+
+        self.assertEqual((report['inserted'], report['failed']), (1, 1))
+
+    def test_email_registered_during_import_is_reported(self):
+        def register_first_email_meanwhile(df, existing_emails):
+            self.add_patient(first_name='Someone', last_name='Else', email='ada@example.com')
+            return validate_patient_frame(df, existing_emails)
+
+        csv = "first_name,last_name,email,date_of_birth,gender\nAda,Lovelace,ada@example.com,1960-05-01,female\nGrace,Hopper,grace@example.com,1960-05-01,female\n"
+        with mock.patch('utils.patient_import.validate_patient_frame', register_first_email_meanwhile):
+            report = import_patients(io.BytesIO(csv.encode()), 'csv')
+
+        self.assertEqual(report['inserted'], 1)
+        self.assertEqual(report['errors'], [{'row': 1, 'email': 'ada@example.com', 'error': DUPLICATE_EMAIL_ERROR}])
+
+    def test_import_route_shows_report(self):
+        self.login_as(self.add_user(role='super admin'))
+
+        response = self.client.post('/import-patients', data={
+            'import_file': (io.BytesIO(self.CSV.encode()), 'patients.csv'),
+        }, content_type='multipart/form-data')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'not-an-email', response.data)
+
+
+class PatientExportTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ada = self.add_patient()
+        self.grace = self.add_patient(first_name='Grace', last_name='Hopper')
+        self.alan = self.add_patient(first_name='Alan', last_name='Turing', gender='male')
+        self.assessments = [
+            {'_id': 'a2', 'patient_id': self.ada, 'date': datetime(2026, 1, 2, tzinfo=timezone.utc), 'bmi': 31.5},
+            {'_id': 'a1', 'patient_id': self.ada, 'bmi': 30.0},
+            {'_id': 'a3', 'patient_id': self.alan, 'bmi': 24.0},
+        ]
+
+        def find(query, projection):
+            # The exporter pops fields off what it gets, so hand out copies
+            ids = query['patient_id']['$in']
+            cursor = mock.Mock()
+            cursor.sort.return_value = [dict(doc) for doc in self.assessments if doc['patient_id'] in ids]
+            return cursor
+
+        self.collection = mock.Mock(find=mock.Mock(side_effect=find))
+
+    def export(self, export_format):
+        return ''.join(export_patients(self.collection, export_format, batch_size=2))
+
+    def test_csv_has_a_row_per_assessment(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+
+        self.assertEqual([(row['first_name'], row['assessment_id']) for row in rows],
+                         [('Ada', 'a2'), ('Ada', 'a1'), ('Grace', ''), ('Alan', 'a3')])
+        self.assertEqual(rows[0]['date'], '2026-01-02T00:00:00+00:00')
+        self.assertEqual(rows[2]['bmi'], '')
+        # One $in query per batch of two patients
+        self.assertEqual(self.collection.find.call_count, 2)
+
+    def test_ndjson_nests_assessments(self):
+        patients = [json.loads(line) for line in self.export('ndjson').splitlines()]
+
+        self.assertEqual([p['id'] for p in patients], [self.ada, self.grace, self.alan])
+        self.assertEqual([a['assessment_id'] for a in patients[0]['assessments']], ['a2', 'a1'])
+        self.assertEqual(patients[0]['assessments'][0]['date'], '2026-01-02T00:00:00+00:00')
+        self.assertEqual(patients[1]['assessments'], [])
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            export_patients(self.collection, 'xml')
+
+    def test_export_route_streams_an_attachment(self):
+        self.login_as(self.add_user(role='super admin'))
+
+        response = self.client.get('/export-patients?format=ndjson')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertIn('patients.ndjson', response.headers['Content-Disposition'])
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), 3)
+
+
+class PatientSearchTest(DatabaseTestCase):
+    def add_many(self, first_name, last_name, count):
+        conn = get_db_connection()
+        with conn:
+            conn.executemany('''
+            INSERT INTO patients_demographics (first_name, last_name, email, date_of_birth, gender)
+            VALUES (?, ?, ?, '1960-05-01', 'male')
+            ''', [(first_name, last_name, f'patient{n}@example.com') for n in range(count)])
+        conn.close()
+
+    def test_best_match_ranks_first_among_many_newer_matches(self):
+        best_id = self.add_patient(first_name='John', last_name='Smith', email='john.smith@example.com')
+        # Newer, weaker matches: the names match but the emails don't
+        self.add_many('John', 'Smithson', 1100)
+
+        results = search_patients('john smi', limit=5)
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[0]['id'], best_id)
+
+    def test_search_follows_updates_and_deletes(self):
+        patient_id = self.add_patient(first_name='Ada', last_name='Lovelace', email='patient1@example.com')
+        self.assertEqual([p['id'] for p in search_patients('lovel')], [patient_id])
+
+        self.execute("UPDATE patients_demographics SET last_name = 'Byron' WHERE id = ?", (patient_id,))
+        self.assertEqual(search_patients('lovel'), [])
+        self.assertEqual([p['id'] for p in search_patients('byr')], [patient_id])
+
+        self.execute("DELETE FROM patients_demographics WHERE id = ?", (patient_id,))
+        self.assertEqual(search_patients('byr'), [])
+
+    def test_short_words_and_email_domains(self):
+        jo_id = self.add_patient(first_name='Jo', last_name='March', email='jo.march@example.com')
+        self.add_patient(first_name='Joan', last_name='Marsh', email='joan.marsh@example.com')
+
+        self.assertEqual(build_search_query('jo marc'), '"jo" "marc"*')
+        self.assertEqual([p['id'] for p in search_patients('jo')], [jo_id])
+        # Every patient shares the domain, only the local part is searched
+        self.assertEqual(build_search_query('jo.march@example.com'), '"jo" "march"*')
+        self.assertEqual([p['id'] for p in search_patients('jo.march@example.com')], [jo_id])
+
+    def test_operators_are_matched_literally(self):
+        self.add_patient()
+        self.assertEqual(build_search_query('ada OR "x'), '"ada"* "OR" "x"')
+        self.assertEqual(search_patients('***'), [])
+
+    def test_broad_prefix_at_realistic_size(self):
+        # A common first name shared by 100,000 patients: only the newest
+        # SEARCH_CANDIDATES matches are ranked, so the search stays fast
+        self.add_many('Maria', 'Garcia', 100_000)
+        newest_id = self.query("SELECT MAX(id) FROM patients_demographics")[0][0]
+
+        started = time.perf_counter()
+        results = search_patients('mar', limit=20)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(p['id'] > newest_id - SEARCH_CANDIDATES for p in results))
+        self.assertLess(elapsed, 0.5)
+
+
+class RiskModelTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model = train_model()
+
+    def assessment(self, bmi):
+        return validate_patient_assessment_data(
+            work_type='private', ever_married='yes', residence_type='urban',
+            avg_glucose_level=110.0, hypertensiv_status='0', bmi=bmi,
+            smoking_status='never smoked', stroke_status='0',
+        )
+
+    def test_missing_bmi_is_imputed(self):
+        assessment = self.assessment(None)
+        self.assertIsNone(assessment['bmi'])
+
+        missing = score_assessment(assessment, 67, 'female', self.model)
+        imputed = score_assessment({**assessment, 'bmi': self.model['fill'][NUMERIC_FEATURES.index('bmi')]},
+                                   67, 'female', self.model)
+        self.assertAlmostEqual(missing, imputed)
+        self.assertTrue(0 < missing < 1)
+
+    def test_out_of_range_bmi_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.assessment(0)
+
+
+class ModelRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.env = mock.patch.dict(os.environ, {'MODEL_REGISTRY_DIR': self.tmp_dir})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def model(self, bias):
+        return {'weights': np.zeros(3), 'bias': np.array(bias)}
+
+    def test_running_process_switches_to_new_current_version(self):
+        publisher = ModelRegistry('test_model', reload_interval=0)
+        reader = ModelRegistry('test_model', reload_interval=60)
+        publisher.publish(self.model(1.0), version='v1')
+
+        with mock.patch('utils.model_registry.time.monotonic', return_value=1000.0):
+            self.assertEqual(reader.get()['version'], 'v1')
+            publisher.publish(self.model(2.0), version='v2')
+            # Within the reload interval the loaded version is kept
+            self.assertEqual(reader.get()['version'], 'v1')
+
+        with mock.patch('utils.model_registry.time.monotonic', return_value=1060.0):
+            model = reader.get()
+
+        self.assertEqual(model['version'], 'v2')
+        self.assertEqual(float(model['bias']), 2.0)
+        self.assertEqual(reader.stats()['loads'], 2)
+        with open(os.path.join(self.tmp_dir, 'test_model', 'CURRENT')) as f:
+            self.assertEqual(f.read(), 'v2')
+
+    def test_nothing_published_returns_none(self):
+        self.assertIsNone(ModelRegistry('test_model').get())
+
+
+class PopulationAnalyticsTest(DatabaseTestCase):
+    def collection(self, facets, per_patient):
+        collection = mock.Mock()
+        collection.aggregate.side_effect = lambda pipeline, **kwargs: iter(
+            [facets] if '$facet' in pipeline[0] else per_patient
+        )
+        return collection
+
+    def test_buckets_and_breakdowns_are_shaped(self):
+        today = datetime.now(timezone.utc).date()
+        middle_aged = self.add_patient(email='a@example.com', date_of_birth=f'{today.year - 50}-01-01', gender='female')
+        elderly = self.add_patient(email='b@example.com', date_of_birth=f'{today.year - 81}-01-01', gender='male')
+        facets = {
+            'totals': [{'_id': None, 'assessments': 8, 'strokes': 2}],
+            'stroke_by_smoking': [{'_id': None, 'assessments': 2, 'strokes': 0},
+                                  {'_id': 'smokes', 'assessments': 6, 'strokes': 2}],
+            'hypertension_by_residence': [{'_id': 'urban', 'assessments': 8, 'hypertensive': 2}],
+            'glucose': [{'_id': 70, 'assessments': 4, 'strokes': 1},
+                        {'_id': 300, 'assessments': 3, 'strokes': 1},
+                        {'_id': 'unknown', 'assessments': 1, 'strokes': 0}],
+            'bmi': [],
+        }
+        per_patient = [
+            {'_id': str(middle_aged), 'assessments': 5, 'strokes': 1},
+            {'_id': elderly, 'assessments': 2, 'strokes': 1},
+            {'_id': 'not-a-patient', 'assessments': 1, 'strokes': 0},
+        ]
+
+        data = compute_population_analytics(self.collection(facets, per_patient))
+
+        self.assertEqual(data['totals'], {'assessments': 8, 'strokes': 2, 'stroke_rate': 0.25})
+        self.assertEqual([row['smoking_status'] for row in data['stroke_by_smoking']], ['unknown', 'smokes'])
+        self.assertEqual(data['hypertension_by_residence'][0]['prevalence'], 0.25)
+        self.assertEqual([(row['range'], row['stroke_rate']) for row in data['glucose']],
+                         [('70–100', 0.25), ('300+', 0.3333), ('unknown', 0.0)])
+        self.assertEqual(data['bmi'], [])
+        self.assertEqual(
+            [(row['age_band'], row['gender'], row['assessments'], row['stroke_rate']) for row in data['by_age_and_gender']],
+            [('45–60', 'female', 5, 0.2), ('75+', 'male', 2, 0.5)],
+        )
+
+    def test_empty_collection(self):
+        facets = {'totals': [], 'stroke_by_smoking': [], 'hypertension_by_residence': [], 'glucose': [], 'bmi': []}
+
+        data = compute_population_analytics(self.collection(facets, []))
+
+        self.assertEqual(data['totals'], {'assessments': 0, 'strokes': 0, 'stroke_rate': 0.0})
+        self.assertEqual(data['by_age_and_gender'], [])
+
+
+class PasswordHashingPoolTest(unittest.TestCase):
+    def setUp(self):
+        # A pool of its own, so the app's pool is left alone
+        patches = [
+            mock.patch.object(utils.password_hashing, '_pool', None),
+            mock.patch.object(utils.password_hashing, '_pool_pid', None),
+            mock.patch.object(utils.password_hashing, '_broken_pid', None),
+            mock.patch.object(utils.password_hashing, '_broken_pool_handler', None),
+            mock.patch.dict(os.environ, {'PASSWORD_HASH_WORKERS': '1'}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        if utils.password_hashing._pool is not None:
+            utils.password_hashing._pool.shutdown(wait=True)
+
+    def test_dead_child_retires_the_gunicorn_worker(self):
+        config = runpy.run_path(os.path.join(GunicornLauncherTest.ROOT_DIR, 'gunicorn.conf.py'))
+        worker = mock.Mock(alive=True, pid=os.getpid())
+        config['post_worker_init'](worker)
+        self.assertTrue(utils.password_hashing.verify_password(generate_password_hash('secret', 'pbkdf2:sha256:1'), 'secret'))
+
+        # The child dies mid-task, which breaks the whole pool
+        with self.assertRaisesRegex(ValueError, 'unavailable'):
+            utils.password_hashing._run(os._exit, 1)
+        self.assertFalse(worker.alive)
+
+        # Until gunicorn replaces the worker, sign-in fails fast without forking again
+        worker.alive = True
+        with self.assertRaisesRegex(ValueError, 'unavailable'):
+            utils.password_hashing.hash_password('secret')
+        self.assertTrue(worker.alive)
+
+
+class ThrottleTest(DatabaseTestCase):
+    def test_login_over_the_limit_gets_429(self):
+        with mock.patch.dict(os.environ, {'THROTTLE_LOGIN_EMAIL': '2/600'}), \
+                mock.patch.object(utils.throttle, '_backend', utils.throttle.MemoryBackend()):
+            statuses = [
+                self.client.post('/', data={'email': 'nobody@example.com', 'password': 'wrong'}).status_code
+                for _ in range(3)
+            ]
+            response = self.client.post('/', data={'email': 'NOBODY@example.com', 'password': 'wrong'})
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response.headers['Retry-After']), 0)
+
+    def test_sqlite_backend_deletes_refilled_buckets(self):
+        backend = utils.throttle.SQLiteBackend(os.path.join(self.tmp_dir, 'throttle.db'))
+
+        def take_at(now, key, capacity, rate):
+            with mock.patch.object(utils.throttle.time, 'time', return_value=now):
+                return backend.take(key, capacity, rate)
+
+        take_at(1000, 'refilled', 5, 1.0)
+        self.assertEqual(take_at(1000, 'drained', 1, 0.001), (True, 0))
+        # The next sweep is due a purge interval after the first one
+        take_at(1000 + utils.throttle.SQLITE_PURGE_INTERVAL, 'new', 5, 1.0)
+
+        keys = [row[0] for row in sqlite3.connect(backend.path).execute("SELECT key FROM throttle_buckets ORDER BY key")]
+        self.assertEqual(keys, ['drained', 'new'])
+        allowed, _ = take_at(1000 + utils.throttle.SQLITE_PURGE_INTERVAL, 'drained', 1, 0.001)
+        self.assertFalse(allowed)
+
+
+class MetricsTokenTest(DatabaseTestCase):
+    def get_metrics(self, authorization=None):
+        headers = {'Authorization': authorization} if authorization else {}
+        with mock.patch.dict(os.environ, {'METRICS_TOKEN': 's3cret'}):
+            return self.client.get('/metrics', headers=headers)
+
+    def test_scraper_with_token_gets_metrics(self):
+        response = self.get_metrics('Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'neuropredict_', response.data)
+
+    def test_wrong_or_missing_token_needs_an_admin_login(self):
+        for authorization in (None, 'Bearer wrong', 'Bearer s3cret ', 'Bearer s\u00e9cret'):
+            response = self.get_metrics(authorization)
+            self.assertEqual(response.status_code, 302, authorization)
+
+        self.login_as(self.add_user(role='super admin'))
+        self.assertEqual(self.get_metrics().status_code, 200)
+
+
+class QueryDiagnosticsTest(DatabaseTestCase):
+    def test_streamed_export_queries_are_logged(self):
+        self.add_patient()
+        self.login_as(self.add_user(role='super admin'))
+
+        with mock.patch.dict(os.environ, {'QUERY_DIAGNOSTICS': '1'}), \
+                mock.patch.object(utils.query_log, '_finish_request', wraps=utils.query_log._finish_request) as finish:
+            response = self.client.get('/export-patients?format=csv')
+            # The export runs while the body is streamed, after the view returned
+            self.assertEqual(len(response.get_data(as_text=True).splitlines()), 2)
+            response.close()
+
+        finish.assert_called_once()
+        queries = finish.call_args.args[0]
+        self.assertIn('SELECT id, first_name, last_name, email, date_of_birth, gender, source_row_id, created_at '
+                      'FROM patients_demographics ORDER BY id', [query['shape'] for query in queries])
+
+
+class ProfileTokenTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        env = mock.patch.dict(os.environ, {'FLASK_SECRET_KEY': 'test', 'PROFILE_DIR': self.tmp_dir})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def test_token_only_verifies_for_its_path_until_it_expires(self):
+        token = sign_profile_token('/users-management')
+        self.assertTrue(verify_profile_token(token, '/users-management'))
+        self.assertFalse(verify_profile_token(token, '/patient-management'))
+        self.assertFalse(verify_profile_token(sign_profile_token('/users-management', max_age=-1), '/users-management'))
+        for garbage in (None, '', 'abc', '99999999999.abc', f'{token}x', token.replace('.', '\u00e9.')):
+            self.assertFalse(verify_profile_token(garbage, '/users-management'), garbage)
+
+    def profile_header(self, token):
+        return self.client.get('/', query_string={'profile': token}).headers.get('X-Profile-File')
+
+    def test_super_admin_with_valid_token_gets_a_profile(self):
+        self.login_as(self.add_user(role='super admin'))
+
+        profile_file = self.profile_header(sign_profile_token('/'))
+
+        self.assertIsNotNone(profile_file)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, profile_file)))
+
+    def test_no_profile_without_admin_or_valid_token(self):
+        self.assertIsNone(self.profile_header(sign_profile_token('/')))
+
+        self.login_as(self.add_user(role='doctor'))
+        self.assertIsNone(self.profile_header(sign_profile_token('/')))
+
+        self.login_as(self.add_user(employee_id='EMP901', role='super admin'))
+        self.assertIsNone(self.profile_header(sign_profile_token('/users-management')))
+        self.assertIsNone(self.profile_header('garbage'))
+
+
 create_database()
 if __name__ == "__main__":
     unittest.main(verbosity=2)
\ No newline at end of file
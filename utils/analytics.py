@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import pandas as pd
+from utils.risk_model import get_patient_demographics
+
+GLUCOSE_BOUNDARIES = [40, 70, 100, 126, 160, 200, 250, 300, 401]
+BMI_BOUNDARIES = [10, 18.5, 25, 30, 35, 40, 81]
+AGE_BANDS = [0, 18, 30, 45, 60, 75, 121]
+
+# stroke_status and hypertensiv_status are ints for seeded assessments and
+# "0"/"1" strings for ones entered through the form
+_STROKE = {"$convert": {"input": "$stroke_status", "to": "int", "onError": 0, "onNull": 0}}
+_HYPERTENSIVE = {"$convert": {"input": "$hypertensiv_status", "to": "int", "onError": 0, "onNull": 0}}
+
+_cache = {"data": None, "computed_at": 0.0}
+_refresh_lock = threading.Lock()
+
+
+def _rate(part, total):
+    return round(part / total, 4) if total else 0.0
+
+
+def _bucket_labels(boundaries):
+    """Label each bucket by its lower bound, the last one is open-ended ('300+')."""
+    labels = {low: f"{low}–{high}" for low, high in zip(boundaries, boundaries[1:])}
+    labels[boundaries[-2]] = f"{boundaries[-2]}+"
+    return labels
+
+
+def population_pipeline():
+    """
+    One aggregation over the assessments, each breakdown a $facet branch,
+    so MongoDB scans the collection once for the whole dashboard.
+    """
+    return [
+        {"$facet": {
+            "totals": [
+                {"$group": {"_id": None, "assessments": {"$sum": 1}, "strokes": {"$sum": _STROKE}}},
+            ],
+            "stroke_by_smoking": [
+                {"$group": {"_id": {"$toLower": "$smoking_status"},
+                            "assessments": {"$sum": 1}, "strokes": {"$sum": _STROKE}}},
+                {"$sort": {"_id": 1}},
+            ],
+            "hypertension_by_residence": [
+                {"$group": {"_id": {"$toLower": "$residence_type"},
+                            "assessments": {"$sum": 1}, "hypertensive": {"$sum": _HYPERTENSIVE}}},
+                {"$sort": {"_id": 1}},
+            ],
+            "glucose": [
+                {"$bucket": {"groupBy": "$avg_glucose_level", "boundaries": GLUCOSE_BOUNDARIES,
+                             "default": "unknown",
+                             "output": {"assessments": {"$sum": 1}, "strokes": {"$sum": _STROKE}}}},
+            ],
+            "bmi": [
+                {"$bucket": {"groupBy": "$bmi", "boundaries": BMI_BOUNDARIES,
+                             "default": "unknown",
+                             "output": {"assessments": {"$sum": 1}, "strokes": {"$sum": _STROKE}}}},
+            ],
+        }},
+    ]
+
+
+def per_patient_pipeline():
+    """Assessment and stroke counts per patient, to be joined with SQLite demographics."""
+    return [
+        {"$group": {"_id": "$patient_id", "assessments": {"$sum": 1}, "strokes": {"$sum": _STROKE}}},
+    ]
+
+
+def _shape_buckets(rows, boundaries):
+    labels = _bucket_labels(boundaries)
+    return [{
+        "range": labels.get(row["_id"], row["_id"]),
+        "assessments": row["assessments"],
+        "strokes": row["strokes"],
+        "stroke_rate": _rate(row["strokes"], row["assessments"]),
+    } for row in rows]
+
+
+def get_demographic_breakdown(patient_assessments_collection):
+    """
+    Stroke rate by age band and gender. MongoDB reduces the assessments
+    to one row per patient, which is merged with the patients' age and
+    gender from SQLite and grouped with pandas.
+    """
+    per_patient = pd.DataFrame(
+        list(patient_assessments_collection.aggregate(per_patient_pipeline(), allowDiskUse=True)),
+        columns=["_id", "assessments", "strokes"],
+    ).rename(columns={"_id": "patient_id"})
+    per_patient["patient_id"] = pd.to_numeric(per_patient["patient_id"], errors="coerce")
+    per_patient = per_patient.dropna(subset=["patient_id"]).astype({"patient_id": "int64"})
+
+    demographics = get_patient_demographics()
+    merged = per_patient.merge(demographics, on="patient_id", how="inner")
+    if merged.empty:
+        return []
+
+    merged["age_band"] = pd.cut(merged["age"], bins=AGE_BANDS, right=False,
+                                labels=list(_bucket_labels(AGE_BANDS).values()))
+    grouped = merged.groupby(["age_band", "gender"], observed=True)[["assessments", "strokes"]].sum()
+
+    return [{
+        "age_band": str(age_band),
+        "gender": gender,
+        "assessments": int(row["assessments"]),
+        "strokes": int(row["strokes"]),
+        "stroke_rate": _rate(row["strokes"], row["assessments"]),
+    } for (age_band, gender), row in grouped.iterrows()]
+
+
+def compute_population_analytics(patient_assessments_collection):
+    """Run the aggregations and shape the results for the dashboard and the JSON API."""
+    started = time.perf_counter()
+    facets = next(patient_assessments_collection.aggregate(population_pipeline(), allowDiskUse=True))
+
+    totals = facets["totals"][0] if facets["totals"] else {"assessments": 0, "strokes": 0}
+    data = {
+        "totals": {
+            "assessments": totals["assessments"],
+            "strokes": totals["strokes"],
+            "stroke_rate": _rate(totals["strokes"], totals["assessments"]),
+        },
+        "stroke_by_smoking": [{
+            "smoking_status": row["_id"] or "unknown",
+            "assessments": row["assessments"],
+            "strokes": row["strokes"],
+            "stroke_rate": _rate(row["strokes"], row["assessments"]),
+        } for row in facets["stroke_by_smoking"]],
+        "hypertension_by_residence": [{
+            "residence_type": row["_id"] or "unknown",
+            "assessments": row["assessments"],
+            "hypertensive": row["hypertensive"],
+            "prevalence": _rate(row["hypertensive"], row["assessments"]),
+        } for row in facets["hypertension_by_residence"]],
+        "glucose": _shape_buckets(facets["glucose"], GLUCOSE_BOUNDARIES),
+        "bmi": _shape_buckets(facets["bmi"], BMI_BOUNDARIES),
+        "by_age_and_gender": get_demographic_breakdown(patient_assessments_collection),
+    }
+    data["computed_at"] = datetime.now(timezone.utc).isoformat()
+    data["compute_seconds"] = round(time.perf_counter() - started, 3)
+    return data
+
+
+def _refresh(patient_assessments_collection):
+    try:
+        _cache["data"] = compute_population_analytics(patient_assessments_collection)
+        _cache["computed_at"] = time.monotonic()
+    except Exception as e:
+        print(f"Population analytics refresh failed: {e}")
+    finally:
+        _refresh_lock.release()
+
+
+def get_population_analytics(patient_assessments_collection):
+    """
+    Cached population analytics. The first call computes them, after that
+    results older than ANALYTICS_MAX_AGE seconds (default 300) are served
+    while a background thread recomputes them, so the page never waits
+    on a full aggregation once warm. Returns None without MongoDB.
+    """
+    if patient_assessments_collection is None:
+        return None
+
+    if _cache["data"] is None:
+        with _refresh_lock:
+            if _cache["data"] is None:
+                _cache["data"] = compute_population_analytics(patient_assessments_collection)
+                _cache["computed_at"] = time.monotonic()
+        return _cache["data"]
+
+    max_age = float(os.environ.get('ANALYTICS_MAX_AGE', 300))
+    if time.monotonic() - _cache["computed_at"] >= max_age and _refresh_lock.acquire(blocking=False):
+        threading.Thread(target=_refresh, args=(patient_assessments_collection,), daemon=True).start()
+
+    return _cache["data"]
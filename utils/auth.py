@@ -1,28 +1,40 @@
 from functools import wraps
-from flask import session, url_for, flash
-from models.users import User
+from flask import g, session, url_for, flash
 import re
 import sqlite3
-from utils.init_db import db_name
-from utils.users import find_user_by_email
-from werkzeug.security import generate_password_hash
+from utils.init_db import db_connection
+from utils.users import find_user_by_email, get_user_by_id, update_password_hash
+from utils.password_hashing import hash_password, verify_password, needs_rehash
 
 
 
 def handle_login(email, password):
     """
     Find the current user by their email.
-    Verify the password using check_password method.
+    Verify the password in the hashing pool (utils/password_hashing.py).
     check of the account is active
     Store only user ID in the session for security.
     """
     current_user = find_user_by_email(email)
 
-    if current_user and current_user.check_password(password):
+    try:
+        password_ok = current_user and verify_password(current_user.password_hash, password)
+    except ValueError as err:
+        flash(str(err), 'error')
+        return False
+
+    if password_ok:
         # Check if account is active
         if not current_user.is_account_active():
             flash('Your account is inactive, please contact admin', 'error')
             return False 
+
+        # Upgrade hashes made with older parameters while we have the plain password
+        if needs_rehash(current_user.password_hash):
+            try:
+                update_password_hash(current_user.id, hash_password(password))
+            except Exception as e:
+                print(f"Password rehash failed for user {current_user.id}: {e}")
         
         session['user_id'] = current_user.id
         return True 
@@ -39,28 +51,12 @@ def get_current_user():
     if not user_id:
         return None
     
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            u.id,
-            u.employee_id,
-            u.email,
-            e.first_name,
-            e.last_name,
-            u.password_hash,
-            u.is_active
-        FROM users u
-        JOIN employee e ON u.employee_id = e.employee_id
-        WHERE u.id = ?
-    ''', (user_id,))
-    row = cursor.fetchone()
-    conn.close()
-    
-    if row:
-        return User(*row)
-    return None
+    # The role decorators and the inject_user context processor all ask
+    # for the user, so resolve it once per request
+    if g.get('current_user_id') != user_id:
+        g.current_user = get_user_by_id(user_id)
+        g.current_user_id = user_id
+    return g.current_user
 
 
 def redirect_user_by_role():
@@ -111,8 +107,7 @@ def validate_credentials(employee_id, email):
     """
     Validate if employee_id and email exist together in Employee table
     """
-    try:        
-        conn = sqlite3.connect(db_name())
+    with db_connection() as conn:
         cursor = conn.cursor()
 
         ''' 
@@ -146,27 +141,25 @@ def validate_credentials(employee_id, email):
         if cursor.fetchone():  
             raise ValueError('Employee ID already registered. Please use a different Employee ID.')
         
-    finally:
-        conn.close()
 
 def create_user(employee_id, email, password):
     """
     Create a new user
+    Raises ValueError if the hashing pool is too busy or broken.
     """
-    
+    password_hash = hash_password(password)
+
     try:
-        conn = sqlite3.connect(db_name())
-        cursor = conn.cursor()
-        
-        password_hash = generate_password_hash(password) 
-        # Insert a new user into the database
-        cursor.execute('''
-        INSERT INTO users (employee_id, email, password_hash, is_active)
-        VALUES (?, ?, ?, ?)
-        ''', (employee_id, email, password_hash, 1))
-        
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+
+            # Insert a new user into the database
+            cursor.execute('''
+            INSERT INTO users (employee_id, email, password_hash, is_active)
+            VALUES (?, ?, ?, ?)
+            ''', (employee_id, email, password_hash, 1))
+
+            conn.commit()
         return True 
 
     except sqlite3.IntegrityError:
@@ -1,11 +1,119 @@
+import os
 import sqlite3
+from contextlib import contextmanager
+from flask import g, has_app_context
+from utils.metrics import record_sqlite_connection, record_sqlite_statement
+from utils.query_log import DiagnosticConnection, sqlite_connection_class
+
+DB_PATH = 'instance/neuroPredict.db'
+
+_instance_dir_ready = False
+
 
 def db_name():
     """Return the database file path as string. Ensures 'instance' directory exists."""
-    import os
-    os.makedirs('instance', exist_ok=True)
-    return 'instance/neuroPredict.db'
+    global _instance_dir_ready
+    # Only touch the filesystem the first time, not on every query
+    if not _instance_dir_ready:
+        os.makedirs('instance', exist_ok=True)
+        _instance_dir_ready = True
+    return DB_PATH
+
+def sqlite_pragmas():
+    """
+    Per-connection pragmas, overridable from the environment (.env).
+    Read on each call so values loaded by load_dotenv() are picked up.
+    """
+    return {
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -20000)),    # negative = KiB, ~20MB
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 134217728)),   # 128MB
+        'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # milliseconds
+    }
 
 def get_db_connection():
-    """Get a database connection"""
-    return sqlite3.connect(db_name())
+    """Get a database connection with the configured pragmas applied."""
+    pragmas = sqlite_pragmas()
+    conn = sqlite3.connect(db_name(), timeout=pragmas['busy_timeout'] / 1000, factory=sqlite_connection_class())
+    for pragma, value in pragmas.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    # Count statements for /metrics, from here on so the pragmas above are not included
+    conn.set_trace_callback(record_sqlite_statement)
+    record_sqlite_connection()
+    # With QUERY_DIAGNOSTICS on, time every statement and note where it was run from
+    if isinstance(conn, DiagnosticConnection):
+        conn.start_recording()
+    return conn
+
+
+def configure_database():
+    """
+    Switch the database to WAL so writers no longer block readers
+    across workers, and report the active settings.
+    journal_mode is persistent in the database file, so this only
+    needs to run once at startup.
+    """
+    journal_mode = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+
+    conn = get_db_connection()
+    try:
+        active_mode = conn.execute(f"PRAGMA journal_mode = {journal_mode}").fetchone()[0]
+
+        settings = {'journal_mode': active_mode}
+        for pragma in sqlite_pragmas():
+            settings[pragma] = conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+    finally:
+        conn.close()
+
+    print("SQLite settings: " + ", ".join(f"{k}={v}" for k, v in settings.items()))
+    return settings
+
+
+def get_request_connection():
+    """
+    Get the connection shared by the current Flask request.
+    Opened on first use and closed by close_request_connection at teardown.
+    """
+    if 'db_conn' not in g:
+        g.db_conn = get_db_connection()
+    return g.db_conn
+
+
+def close_request_connection(exception=None):
+    """
+    Close the request connection if one was opened.
+    Any uncommitted changes are rolled back when the connection closes.
+    """
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.close()
+
+
+@contextmanager
+def db_connection():
+    """
+    Yield a database connection.
+    Inside a request the per-request connection is reused, outside one
+    (seeding, scripts) a short-lived connection is opened and closed.
+    """
+    if has_app_context():
+        conn = get_request_connection()
+        try:
+            yield conn
+        except Exception:
+            # Don't leave a half-done write open for the rest of the request
+            conn.rollback()
+            raise
+        return
+
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def init_db_connection(app):
+    """Register the teardown that releases the per-request connection."""
+    app.teardown_appcontext(close_request_connection)
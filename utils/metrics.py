@@ -0,0 +1,211 @@
+import contextvars
+import hmac
+import os
+import threading
+import time
+from flask import g, request
+from pymongo import monitoring
+
+# Prometheus default latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PER_REQUEST_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Query and command counts for the request being served. Worker threads that
+# run on its behalf (utils/patient_view.py) are given this variable, so their
+# queries are counted against the same request.
+request_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_label_text(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        names = self.labels + ('le',)
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f'{self.name}_bucket{_label_text(names, key + (bound,))} {count}')
+                lines.append(f'{self.name}_bucket{_label_text(names, key + ("+Inf",))} {series["count"]}')
+                lines.append(f'{self.name}_sum{_label_text(self.labels, key)} {series["sum"]}')
+                lines.append(f'{self.name}_count{_label_text(self.labels, key)} {series["count"]}')
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    'neuropredict_http_request_duration_seconds', 'Request latency by endpoint.',
+    labels=('endpoint', 'method', 'status'))
+SQL_PER_REQUEST = Histogram(
+    'neuropredict_sqlite_queries_per_request', 'SQLite statements executed per request.',
+    labels=('endpoint',), buckets=PER_REQUEST_BUCKETS)
+CONNECTIONS_PER_REQUEST = Histogram(
+    'neuropredict_sqlite_connections_per_request', 'SQLite connections opened per request.',
+    labels=('endpoint',), buckets=PER_REQUEST_BUCKETS)
+MONGO_PER_REQUEST = Histogram(
+    'neuropredict_mongo_commands_per_request', 'MongoDB commands sent per request.',
+    labels=('endpoint',), buckets=PER_REQUEST_BUCKETS)
+SQL_TOTAL = Counter('neuropredict_sqlite_queries_total', 'SQLite statements executed.')
+CONNECTIONS_TOTAL = Counter('neuropredict_sqlite_connections_opened_total', 'SQLite connections opened.')
+MONGO_DURATION = Histogram(
+    'neuropredict_mongo_command_duration_seconds', 'MongoDB command latency by command.',
+    labels=('command',))
+MONGO_FAILURES = Counter(
+    'neuropredict_mongo_command_failures_total', 'MongoDB commands that failed.', labels=('command',))
+
+METRICS = [
+    REQUEST_DURATION, SQL_PER_REQUEST, CONNECTIONS_PER_REQUEST, MONGO_PER_REQUEST,
+    SQL_TOTAL, CONNECTIONS_TOTAL, MONGO_DURATION, MONGO_FAILURES,
+]
+
+
+def _count(name):
+    stats = request_stats.get()
+    if stats is not None:
+        stats[name] += 1
+
+
+def record_sqlite_connection():
+    """Called by get_db_connection for every new connection."""
+    CONNECTIONS_TOTAL.inc()
+    _count('connections')
+
+
+def record_sqlite_statement(statement):
+    """sqlite3 trace callback, called for every statement a connection runs."""
+    SQL_TOTAL.inc()
+    _count('sql')
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the MongoClient sends, registered in mongo_client_options."""
+    def started(self, event):
+        _count('mongo')
+
+    def succeeded(self, event):
+        MONGO_DURATION.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        MONGO_DURATION.observe(event.duration_micros / 1e6, command=event.command_name)
+        MONGO_FAILURES.inc(command=event.command_name)
+
+
+def _endpoint():
+    # The URL rule, not the path, so /patient/1 and /patient/2 share one series
+    return request.url_rule.rule if request.url_rule else '<unmatched>'
+
+
+def _collect_extras():
+    """Render counters kept by other modules in their own structures."""
+    from utils.throttle import get_throttle_counters
+    from utils.risk_model import registry as risk_model_registry
+
+    throttle = Counter('neuropredict_throttle_decisions_total', 'Login/register throttle decisions.',
+                       labels=('rule', 'decision'))
+    for (rule, decision), count in get_throttle_counters().items():
+        throttle.inc(count, rule=rule, decision=decision)
+    lines = throttle.render()
+
+    stats = risk_model_registry.stats()
+    for key, help_text in (
+        ('load_seconds', 'Time the current risk model took to load.'),
+        ('inference_calls', 'Risk model predict calls.'),
+        ('inference_rows', 'Assessments scored by the risk model.'),
+        ('inference_seconds', 'Time spent in risk model predict calls.'),
+    ):
+        if stats[key] is not None:
+            name = f'neuropredict_risk_model_{key}'
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {stats[key]}']
+    return lines
+
+
+def render_metrics():
+    """Every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    lines += _collect_extras()
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """Register the hooks that time every request and count its queries."""
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        request_stats.set({'sql': 0, 'connections': 0, 'mongo': 0})
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = _endpoint()
+            REQUEST_DURATION.observe(time.perf_counter() - started, endpoint=endpoint,
+                                     method=request.method, status=response.status_code)
+            stats = request_stats.get()
+            if stats is not None:
+                SQL_PER_REQUEST.observe(stats['sql'], endpoint=endpoint)
+                CONNECTIONS_PER_REQUEST.observe(stats['connections'], endpoint=endpoint)
+                MONGO_PER_REQUEST.observe(stats['mongo'], endpoint=endpoint)
+        return response
+
+    @app.teardown_request
+    def clear_request_metrics(exception=None):
+        request_stats.set(None)
+
+
+def metrics_token_ok(authorization):
+    """True if the Authorization header carries METRICS_TOKEN, for scrapers that can't log in."""
+    token = os.environ.get('METRICS_TOKEN')
+    if not token or not authorization:
+        return False
+    # Constant time, so response timing does not reveal how much of the token matched
+    return hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
@@ -0,0 +1,143 @@
+from utils.init_db import db_connection
+
+# Ordered schema migrations. Append new ones with the next version number,
+# never edit or reorder one that has already been released.
+MIGRATIONS = [
+    (1, "Index patient and user listings on (created_at, id)", [
+        "CREATE INDEX IF NOT EXISTS idx_patients_created_at_id ON patients_demographics (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users (created_at, id)",
+    ]),
+    (2, "Index seeder lookups on patients_demographics.source_row_id", [
+        "CREATE INDEX IF NOT EXISTS idx_patients_source_row_id ON patients_demographics (source_row_id)",
+    ]),
+    (3, "Index user overview counts on users.is_active", [
+        "CREATE INDEX IF NOT EXISTS idx_users_is_active ON users (is_active)",
+    ]),
+    (4, "Materialize dashboard counts in table_counters, kept up to date by triggers", [
+        """CREATE TABLE IF NOT EXISTS table_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )""",
+        "INSERT OR REPLACE INTO table_counters (name, value) SELECT 'patients', COUNT(*) FROM patients_demographics",
+        "INSERT OR REPLACE INTO table_counters (name, value) SELECT 'users', COUNT(*) FROM users",
+        "INSERT OR REPLACE INTO table_counters (name, value) SELECT 'active_users', COUNT(*) FROM users WHERE is_active = 1",
+        """CREATE TRIGGER IF NOT EXISTS trg_patients_count_insert AFTER INSERT ON patients_demographics
+        BEGIN
+            UPDATE table_counters SET value = value + 1 WHERE name = 'patients';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_patients_count_delete AFTER DELETE ON patients_demographics
+        BEGIN
+            UPDATE table_counters SET value = value - 1 WHERE name = 'patients';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_users_count_insert AFTER INSERT ON users
+        BEGIN
+            UPDATE table_counters SET value = value + 1 WHERE name = 'users';
+            UPDATE table_counters SET value = value + (NEW.is_active IS 1) WHERE name = 'active_users';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_users_count_delete AFTER DELETE ON users
+        BEGIN
+            UPDATE table_counters SET value = value - 1 WHERE name = 'users';
+            UPDATE table_counters SET value = value - (OLD.is_active IS 1) WHERE name = 'active_users';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_users_count_active AFTER UPDATE OF is_active ON users
+        BEGIN
+            UPDATE table_counters
+            SET value = value + (NEW.is_active IS 1) - (OLD.is_active IS 1)
+            WHERE name = 'active_users';
+        END""",
+    ]),
+    (5, "Full-text search over patient names and email local parts (patients_fts), kept in sync by triggers", [
+        # Only the part of the email before the @ is indexed. Domains such as
+        # example.com are shared by most patients and would make every search
+        # that mentions them read the whole index.
+        """CREATE VIEW IF NOT EXISTS patients_search AS
+        SELECT id, first_name, last_name, substr(email, 1, instr(email, '@') - 1) AS email_name
+        FROM patients_demographics""",
+        """CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+            first_name, last_name, email_name,
+            content='patients_search', content_rowid='id', prefix='3'
+        )""",
+        "INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')",
+        """CREATE TRIGGER IF NOT EXISTS trg_patients_fts_insert AFTER INSERT ON patients_demographics
+        BEGIN
+            INSERT INTO patients_fts (rowid, first_name, last_name, email_name)
+            VALUES (NEW.id, NEW.first_name, NEW.last_name, substr(NEW.email, 1, instr(NEW.email, '@') - 1));
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_patients_fts_delete AFTER DELETE ON patients_demographics
+        BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, first_name, last_name, email_name)
+            VALUES ('delete', OLD.id, OLD.first_name, OLD.last_name, substr(OLD.email, 1, instr(OLD.email, '@') - 1));
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_patients_fts_update AFTER UPDATE OF first_name, last_name, email ON patients_demographics
+        BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, first_name, last_name, email_name)
+            VALUES ('delete', OLD.id, OLD.first_name, OLD.last_name, substr(OLD.email, 1, instr(OLD.email, '@') - 1));
+            INSERT INTO patients_fts (rowid, first_name, last_name, email_name)
+            VALUES (NEW.id, NEW.first_name, NEW.last_name, substr(NEW.email, 1, instr(NEW.email, '@') - 1));
+        END""",
+    ]),
+]
+
+
+def init_schema_migrations():
+    """
+    Create the schema_migrations table that records applied versions.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        conn.commit()
+
+
+def get_schema_version():
+    """Return the highest applied migration version, 0 if none."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        version = cursor.fetchone()[0]
+
+    return version
+
+
+def run_migrations():
+    """
+    Apply every migration newer than the recorded schema version.
+    Statements are idempotent (IF NOT EXISTS) and only add objects, so
+    existing data is kept and a failed migration can simply be re-run.
+    """
+    init_schema_migrations()
+    current_version = get_schema_version()
+
+    applied = 0
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        for version, description, statements in MIGRATIONS:
+            if version <= current_version:
+                continue
+
+            try:
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute('''
+                INSERT INTO schema_migrations (version, description) VALUES (?, ?)
+                ''', (version, description))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            applied += 1
+            print(f"Applied migration {version}: {description}")
+
+    print(f"Schema at version {get_schema_version()} ({applied} migrations applied).")
+    return applied
@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+# Arrays at least this large are memory-mapped instead of read into memory
+MMAP_MIN_BYTES = 1024 * 1024
+
+
+def registry_root():
+    """Directory holding every model's versions, overridable with MODEL_REGISTRY_DIR."""
+    return os.environ.get('MODEL_REGISTRY_DIR', 'instance/models')
+
+
+class ModelRegistry:
+    """
+    Versioned model artifacts on disk, loaded once per process.
+
+    Each version is a directory of .npy arrays plus meta.json, and a
+    CURRENT file names the live one. get() returns the loaded model and
+    checks CURRENT at most every reload_interval seconds, so publishing
+    a new version is picked up by running processes without a restart.
+    """
+    def __init__(self, name, validate=None, reload_interval=None):
+        self.name = name
+        self.validate = validate
+        self.reload_interval = reload_interval if reload_interval is not None else \
+            float(os.environ.get('MODEL_RELOAD_INTERVAL', 5))
+
+        self._lock = threading.Lock()
+        self._model = None
+        self._checked_at = 0.0
+        self._stats = {
+            'loads': 0,
+            'load_seconds': None,
+            'loaded_at': None,
+            'inference_calls': 0,
+            'inference_rows': 0,
+            'inference_seconds': 0.0,
+        }
+
+    def directory(self):
+        return os.path.join(registry_root(), self.name)
+
+    def current_version(self):
+        """The published version named by CURRENT, None if nothing is published."""
+        try:
+            with open(os.path.join(self.directory(), 'CURRENT')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(self, model, version=None):
+        """
+        Write a model (a dict of NumPy arrays and JSON-serializable values)
+        as a new version and make it current. Both steps are atomic renames,
+        so readers never see a half-written version.
+        """
+        version = version or datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')
+        final_dir = os.path.join(self.directory(), version)
+        tmp_dir = final_dir + '.tmp'
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        meta = {'version': version, 'published_at': datetime.now(timezone.utc).isoformat()}
+        for key, value in model.items():
+            if isinstance(value, np.ndarray):
+                np.save(os.path.join(tmp_dir, f'{key}.npy'), value)
+            else:
+                meta[key] = value
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_dir, final_dir)
+
+        current_tmp = os.path.join(self.directory(), 'CURRENT.tmp')
+        with open(current_tmp, 'w') as f:
+            f.write(version)
+        os.replace(current_tmp, os.path.join(self.directory(), 'CURRENT'))
+
+        # Make the next get() look at CURRENT straight away
+        self._checked_at = 0.0
+        return version
+
+    def _load(self, version):
+        started = time.perf_counter()
+        version_dir = os.path.join(self.directory(), version)
+
+        with open(os.path.join(version_dir, 'meta.json')) as f:
+            model = json.load(f)
+        for filename in os.listdir(version_dir):
+            if filename.endswith('.npy'):
+                path = os.path.join(version_dir, filename)
+                mmap_mode = 'r' if os.path.getsize(path) >= MMAP_MIN_BYTES else None
+                model[filename[:-4]] = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+
+        if self.validate:
+            self.validate(model)
+
+        elapsed = time.perf_counter() - started
+        self._stats.update(
+            loads=self._stats['loads'] + 1,
+            load_seconds=elapsed,
+            loaded_at=datetime.now(timezone.utc).isoformat(),
+        )
+        print(f"Loaded model {self.name} version {version} in {elapsed * 1000:.1f}ms")
+        return model
+
+    def get(self):
+        """The current model, or None if no version has been published."""
+        now = time.monotonic()
+        if self._model is None or now - self._checked_at >= self.reload_interval:
+            with self._lock:
+                if self._model is None or now - self._checked_at >= self.reload_interval:
+                    self._checked_at = now
+                    version = self.current_version()
+                    if version and (self._model is None or self._model['version'] != version):
+                        self._model = self._load(version)
+        return self._model
+
+    def record_inference(self, seconds, rows=1):
+        with self._lock:
+            self._stats['inference_calls'] += 1
+            self._stats['inference_rows'] += rows
+            self._stats['inference_seconds'] += seconds
+
+    def stats(self):
+        """Load and inference metrics for this process."""
+        with self._lock:
+            stats = dict(self._stats)
+        calls = stats['inference_calls']
+        return {
+            'name': self.name,
+            'version': self._model['version'] if self._model else None,
+            **stats,
+            'mean_inference_ms': stats['inference_seconds'] / calls * 1000 if calls else None,
+        }
@@ -0,0 +1,80 @@
+import os
+import threading
+from pymongo import MongoClient
+from utils.metrics import MongoCommandMetrics
+from utils.query_log import MongoQueryDiagnostics
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def mongo_client_options():
+    """
+    Pool size and timeouts for the MongoClient, overridable from the environment (.env).
+    """
+    return {
+        'maxPoolSize': int(os.environ.get('MONGODB_MAX_POOL_SIZE', 50)),
+        'minPoolSize': int(os.environ.get('MONGODB_MIN_POOL_SIZE', 0)),
+        'serverSelectionTimeoutMS': int(os.environ.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        'connectTimeoutMS': int(os.environ.get('MONGODB_CONNECT_TIMEOUT_MS', 5000)),
+        'socketTimeoutMS': int(os.environ.get('MONGODB_SOCKET_TIMEOUT_MS', 10000)),
+        # Command timings for /metrics, and per-request query diagnostics
+        'event_listeners': [MongoCommandMetrics(), MongoQueryDiagnostics()],
+    }
+
+
+def mongo_configured():
+    """Return True if the MongoDB environment variables are set."""
+    return bool(os.environ.get("MONGODB_URI") and os.environ.get("MONGODB_NAME"))
+
+
+def get_mongo_client():
+    """
+    Get the process-wide MongoClient, created on first use.
+    connect=False means nothing touches the network until the first query.
+    A forked worker gets its own client, as MongoClient is not fork-safe.
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = MongoClient(os.environ.get("MONGODB_URI"), connect=False, **mongo_client_options())
+                _client_pid = pid
+    return _client
+
+
+def _reset_client_after_fork():
+    """Drop the parent's client in a forked child, it must not be reused there."""
+    global _client, _client_pid
+    _client = None
+    _client_pid = None
+
+
+os.register_at_fork(after_in_child=_reset_client_after_fork)
+
+
+def get_mongo_db():
+    """Get the application database from the shared client."""
+    return get_mongo_client()[os.environ.get("MONGODB_NAME")]
+
+
+class LazyCollection:
+    """
+    Stands in for a pymongo Collection named by an environment variable.
+    Every attribute is looked up on the current process's shared client,
+    so routes can hold one at import time and still be fork-safe.
+    """
+    def __init__(self, env_name):
+        self.env_name = env_name
+
+    def collection(self):
+        return get_mongo_db()[os.environ.get(self.env_name)]
+
+    def __getattr__(self, name):
+        return getattr(self.collection(), name)
+
+    def __repr__(self):
+        return f"LazyCollection({os.environ.get(self.env_name)!r})"
@@ -0,0 +1,93 @@
+import threading
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# Indexes for the query shapes the routes and the seeder run
+ASSESSMENT_INDEXES = [
+    IndexModel([("patient_id", ASCENDING), ("_id", DESCENDING)], name="patient_id_id"),
+    IndexModel([("source_row_id", ASCENDING)], name="source_row_id"),
+]
+
+EMERGENCY_CONTACT_INDEXES = [
+    IndexModel([("patient_id", ASCENDING)], name="patient_id"),
+]
+
+# Replaced indexes that existing deployments still have, dropped so
+# writes stop maintaining them
+OBSOLETE_ASSESSMENT_INDEXES = ["patient_id_date"]
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def find_collection_scans(query_shapes):
+    """
+    Run explain() for each (label, cursor) query shape and return the
+    labels whose winning plan still does a full collection scan.
+    """
+    scans = []
+    for label, cursor in query_shapes:
+        winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            scans.append(label)
+    return scans
+
+
+def init_mongo_indexes(patient_assessments_collection, emergency_contact_coll):
+    """
+    Create the MongoDB indexes, one batched create_indexes call per
+    collection, drop the obsolete ones, then check the hot query shapes
+    with explain(). create_indexes is a no-op for indexes that already exist.
+    Returns the query shapes that still scan the collection.
+    """
+    if patient_assessments_collection is None or emergency_contact_coll is None:
+        print("MongoDB unavailable, skipping index bootstrap.")
+        return []
+
+    try:
+        patient_assessments_collection.create_indexes(ASSESSMENT_INDEXES)
+        emergency_contact_coll.create_indexes(EMERGENCY_CONTACT_INDEXES)
+        existing = patient_assessments_collection.index_information()
+        for name in OBSOLETE_ASSESSMENT_INDEXES:
+            if name in existing:
+                patient_assessments_collection.drop_index(name)
+                print(f"Dropped obsolete MongoDB index {name}")
+
+        scans = find_collection_scans([
+            ("assessments by patient_id, newest first",
+             patient_assessments_collection.find({"patient_id": 0}).sort("_id", DESCENDING)),
+            ("assessments by source_row_id",
+             patient_assessments_collection.find({"source_row_id": 0})),
+            ("emergency contacts by patient_id",
+             emergency_contact_coll.find({"patient_id": 0})),
+        ])
+    except Exception as e:
+        print(f"MongoDB index bootstrap failed: {e}")
+        return []
+
+    for label in scans:
+        print(f"WARNING: MongoDB query still scans the collection: {label}")
+    if not scans:
+        print("MongoDB indexes ready.")
+    return scans
+
+
+def start_mongo_index_bootstrap(patient_assessments_collection, emergency_contact_coll):
+    """
+    Run init_mongo_indexes on a background thread so startup doesn't wait on MongoDB.
+    """
+    thread = threading.Thread(
+        target=init_mongo_indexes,
+        args=(patient_assessments_collection, emergency_contact_coll),
+        daemon=True,
+    )
+    thread.start()
+    return thread
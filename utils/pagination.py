@@ -0,0 +1,73 @@
+import base64
+import json
+
+
+def encode_cursor(created_at, row_id, direction='next'):
+    """
+    Build an opaque cursor from the (created_at, id) keyset of a row.
+    direction is 'next' (older rows) or 'prev' (newer rows).
+    """
+    payload = json.dumps([created_at, row_id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor.
+    Returns (created_at, id, direction) or raises ValueError if it is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id, direction = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError('Invalid pagination cursor.')
+
+    if direction not in ('next', 'prev') or not isinstance(row_id, int):
+        raise ValueError('Invalid pagination cursor.')
+    return created_at, row_id, direction
+
+
+def keyset_query(base_sql, cursor=None, per_page=10, prefix=''):
+    """
+    Add the keyset WHERE/ORDER BY/LIMIT clauses to base_sql.
+    prefix is the table alias for created_at/id (e.g. 'u.').
+    Fetches one extra row so the caller can tell if there are more.
+    Returns (sql, params, direction).
+    """
+    columns = f"({prefix}created_at, {prefix}id)"
+
+    if not cursor:
+        sql = f"{base_sql} ORDER BY {prefix}created_at DESC, {prefix}id DESC LIMIT ?"
+        return sql, (per_page + 1,), 'next'
+
+    created_at, row_id, direction = decode_cursor(cursor)
+    if direction == 'next':
+        sql = f"{base_sql} WHERE {columns} < (?, ?) ORDER BY {prefix}created_at DESC, {prefix}id DESC LIMIT ?"
+    else:
+        # Walk backwards in ascending order, the caller flips the rows back
+        sql = f"{base_sql} WHERE {columns} > (?, ?) ORDER BY {prefix}created_at ASC, {prefix}id ASC LIMIT ?"
+    return sql, (created_at, row_id, per_page + 1), direction
+
+
+def keyset_page(rows, cursor, direction, per_page, key):
+    """
+    Trim the extra row from a keyset_query result and build the cursors.
+    key(row) returns the (created_at, id) of a row.
+    Returns (rows, next_cursor, prev_cursor).
+    """
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == 'prev':
+        rows = list(reversed(rows))
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = bool(cursor), has_more
+
+    next_cursor = prev_cursor = None
+    if rows and has_older:
+        next_cursor = encode_cursor(*key(rows[-1]), direction='next')
+    if rows and has_newer:
+        prev_cursor = encode_cursor(*key(rows[0]), direction='prev')
+
+    return rows, next_cursor, prev_cursor
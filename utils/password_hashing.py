@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = None
+# pid whose pool broke, and what to do about it (see set_broken_pool_handler)
+_broken_pid = None
+_broken_pool_handler = None
+POOL_BROKEN_ERROR = 'Sign-in is unavailable at the moment, please try again shortly.'
+
+
+def password_hash_method():
+    """
+    Werkzeug method string new hashes are made with, e.g. 'scrypt:32768:8:1'
+    or 'pbkdf2:sha256:600000'. Always give the parameters, stored hashes
+    made with anything else are rehashed on the next successful login.
+    """
+    return os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+
+def set_broken_pool_handler(handler):
+    """
+    Register a callable run once when a crashed worker breaks this process's
+    pool. gunicorn.conf.py uses it to retire the gunicorn worker, so the
+    master forks a clean replacement that starts a fresh pool.
+    """
+    global _broken_pool_handler
+    _broken_pool_handler = handler
+
+
+def _get_pool():
+    """
+    The process's hashing pool and its in-flight limit, created on first use.
+    Hashing runs in separate processes so it never holds the GIL that the
+    page-serving threads need. A forked worker gets its own pool.
+    Raises ValueError once the pool has broken in this process.
+    """
+    global _pool, _pool_pid, _slots
+
+    pid = os.getpid()
+    if _broken_pid == pid:
+        raise ValueError(POOL_BROKEN_ERROR)
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                workers = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+                # fork, since spawn and forkserver would re-run app.py's startup in each child
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+                _slots = threading.BoundedSemaphore(int(os.environ.get('PASSWORD_HASH_MAX_PENDING', workers * 4)))
+                _pool_pid = pid
+    return _pool, _slots
+
+
+def _run(fn, *args):
+    """
+    Run fn in the hashing pool. Raises ValueError if PASSWORD_HASH_MAX_PENDING
+    hashes are already queued or running and no slot frees up within
+    PASSWORD_HASH_QUEUE_TIMEOUT seconds, so a login storm is turned away
+    early instead of tying up every request thread. Also raises ValueError
+    if a worker crash has broken the pool.
+    """
+    global _broken_pid
+
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 5))):
+        raise ValueError('Too many sign-in attempts at the moment, please try again shortly.')
+    try:
+        return pool.submit(fn, *args).result()
+    except BrokenProcessPool as e:
+        # A crashed worker breaks the whole pool. Forking a new one here would
+        # copy a process full of request threads, so the pool stays down and
+        # the handler gets the process replaced instead
+        with _pool_lock:
+            first_failure = _broken_pid != os.getpid()
+            _broken_pid = os.getpid()
+        if first_failure:
+            print("Password hashing pool broke, sign-in is unavailable until this process is replaced")
+            if _broken_pool_handler is not None:
+                _broken_pool_handler()
+        raise ValueError(POOL_BROKEN_ERROR) from e
+    finally:
+        slots.release()
+
+
+def start_password_hashing():
+    """Start the pool's worker processes now, while the process has few threads to fork."""
+    _run(generate_password_hash, 'warm-up', 'pbkdf2:sha256:1')
+
+
+def hash_password(password):
+    """Hash a password with the configured method, off the request thread."""
+    return _run(generate_password_hash, password, password_hash_method())
+
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash, off the request thread."""
+    if not password_hash:
+        return False
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True if the stored hash was made with a method other than the configured one."""
+    return password_hash.split('$', 1)[0] != password_hash_method()
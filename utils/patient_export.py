@@ -0,0 +1,160 @@
+import csv
+import io
+import json
+from datetime import datetime
+from utils.init_db import get_db_connection
+from utils.patients import ASSESSMENT_HISTORY_FIELDS
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+PATIENT_EXPORT_COLUMNS = ['id', 'first_name', 'last_name', 'email', 'date_of_birth', 'gender', 'source_row_id', 'created_at']
+ASSESSMENT_EXPORT_COLUMNS = ['assessment_id', 'date', *ASSESSMENT_HISTORY_FIELDS]
+ASSESSMENT_EXPORT_FIELDS = {"patient_id": 1, "date": 1, **ASSESSMENT_HISTORY_FIELDS}
+
+
+def iter_patient_batches(batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield lists of patient dicts, batch_size at a time, ordered by id.
+    The rows are pulled from an open SQLite cursor with fetchmany, so
+    only one batch is held in memory. A dedicated connection is used as
+    a streamed response outlives the request's shared connection.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {', '.join(PATIENT_EXPORT_COLUMNS)}
+            FROM patients_demographics
+            ORDER BY id
+        ''')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [dict(zip(PATIENT_EXPORT_COLUMNS, row)) for row in rows]
+    finally:
+        conn.close()
+
+
+def get_assessments_for_patients(patient_assessments_collection, patient_ids):
+    """
+    Fetch the assessments for a batch of patients with one $in query.
+    Returns {patient_id: [assessment, ...]}, newest first.
+    """
+    grouped = {patient_id: [] for patient_id in patient_ids}
+    if patient_assessments_collection is None or not patient_ids:
+        return grouped
+
+    cursor = patient_assessments_collection.find(
+        {"patient_id": {"$in": list(patient_ids)}}, ASSESSMENT_EXPORT_FIELDS
+    ).sort([("patient_id", 1), ("_id", -1)])
+
+    for doc in cursor:
+        grouped.setdefault(doc.pop("patient_id"), []).append({
+            "assessment_id": str(doc.pop("_id")),
+            **doc,
+        })
+    return grouped
+
+
+def iter_patients_with_assessments(patient_assessments_collection, batch_size=EXPORT_BATCH_SIZE):
+    """Yield (patient, assessments) pairs, one SQLite batch and one Mongo query at a time."""
+    for patients in iter_patient_batches(batch_size):
+        assessments = get_assessments_for_patients(
+            patient_assessments_collection, [p['id'] for p in patients]
+        )
+        for patient in patients:
+            yield patient, assessments.get(patient['id'], [])
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _drain(buffer):
+    """Return what has been written to buffer and empty it."""
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return data
+
+
+def export_patients_csv(patient_assessments_collection, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield CSV text, one chunk per patient batch. There is one row per
+    assessment, and patients without assessments get a single row with
+    the assessment columns left empty.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=PATIENT_EXPORT_COLUMNS + ASSESSMENT_EXPORT_COLUMNS,
+                            extrasaction='ignore')
+    writer.writeheader()
+    yield _drain(buffer)
+
+    written = 0
+    for patient, assessments in iter_patients_with_assessments(patient_assessments_collection, batch_size):
+        for assessment in assessments or [{}]:
+            row = {**patient, **assessment}
+            if isinstance(row.get('date'), datetime):
+                row['date'] = row['date'].isoformat()
+            writer.writerow(row)
+
+        written += 1
+        if written % batch_size == 0:
+            yield _drain(buffer)
+
+    yield _drain(buffer)
+
+
+def export_patients_ndjson(patient_assessments_collection, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield NDJSON text, one chunk per patient batch. Each line is a
+    patient with its assessments nested under "assessments".
+    """
+    lines = []
+    for patient, assessments in iter_patients_with_assessments(patient_assessments_collection, batch_size):
+        lines.append(json.dumps({**patient, "assessments": assessments}, default=_json_default))
+        if len(lines) == batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export_patients(patient_assessments_collection, export_format, batch_size=EXPORT_BATCH_SIZE):
+    """Return a generator of text chunks for export_format, raise ValueError if it is unknown."""
+    if export_format == 'csv':
+        return export_patients_csv(patient_assessments_collection, batch_size)
+    if export_format == 'ndjson':
+        return export_patients_ndjson(patient_assessments_collection, batch_size)
+    raise ValueError('Export format must be csv or ndjson.')
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    from dotenv import load_dotenv
+    from utils.mongo import mongo_configured, LazyCollection
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Export patients and their assessments.')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--output', help='file to write to (default: stdout)')
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE,
+                        help=f'patients per SQLite batch and Mongo query (default {EXPORT_BATCH_SIZE})')
+    args = parser.parse_args()
+
+    collection = LazyCollection("MONGODB_PATIENT_ASSESSMENTS_COLLECTION") if mongo_configured() else None
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in export_patients(collection, args.format, args.batch_size):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
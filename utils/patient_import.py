@@ -0,0 +1,160 @@
+import os
+import sqlite3
+from datetime import date
+import pandas as pd
+from utils.init_db import db_connection
+from utils.patients import EMAIL_PATTERN, ALLOWED_GENDERS, MIN_AGE, MAX_AGE
+
+IMPORT_COLUMNS = ['first_name', 'last_name', 'email', 'date_of_birth', 'gender']
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_FORMATS = ('csv', 'parquet')
+DUPLICATE_EMAIL_ERROR = 'Email already registered. Please use a different email'
+
+INSERT_PATIENT_SQL = '''
+INSERT INTO patients_demographics (first_name, last_name, email, date_of_birth, gender, source_row_id)
+VALUES (:first_name, :last_name, :email, :date_of_birth, :gender, NULL)
+'''
+
+
+def detect_import_format(filename):
+    """Return 'csv' or 'parquet' from a file name, raise ValueError otherwise."""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension not in IMPORT_FORMATS:
+        raise ValueError('Please upload a .csv or .parquet file.')
+    return extension
+
+
+def iter_import_chunks(source, file_format, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Yield the import file as DataFrames of at most chunk_size rows,
+    so large files are never loaded into memory at once.
+    source is a path or a binary file object.
+    """
+    if file_format == 'csv':
+        reader = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size)
+        for chunk in reader:
+            yield chunk
+        return
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError('Parquet import requires the pyarrow package.')
+
+    for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas().fillna('').astype(str)
+
+
+def validate_patient_frame(df, existing_emails):
+    """
+    Vectorized form of validate_patient_data for a chunk of import rows.
+    Checks run in the same order, and each row keeps its first error.
+    Returns (valid_rows, errors), where errors is a Series of messages
+    indexed like df.
+    """
+    missing = [c for c in IMPORT_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Import file is missing columns: {', '.join(missing)}")
+
+    df = df[IMPORT_COLUMNS].fillna('').apply(lambda col: col.astype(str).str.strip())
+    df['gender'] = df['gender'].str.lower()
+
+    errors = pd.Series(None, index=df.index, dtype=object)
+
+    def flag(mask, message):
+        errors[mask & errors.isna()] = message
+
+    flag((df == '').any(axis=1), 'All fields are required. Please fill out all fields.')
+    flag(df['email'].isin(existing_emails), DUPLICATE_EMAIL_ERROR)
+    flag(df['email'].duplicated(), 'Email appears more than once in the import file.')
+    flag(~df['email'].str.match(EMAIL_PATTERN), 'Please enter a valid email address')
+
+    dob = pd.to_datetime(df['date_of_birth'], format='%Y-%m-%d', errors='coerce')
+    flag(dob.isna(), 'Date of birth must be in YYYY-MM-DD format.')
+
+    today = date.today()
+    before_birthday = (dob.dt.month > today.month) | ((dob.dt.month == today.month) & (dob.dt.day > today.day))
+    age = today.year - dob.dt.year - before_birthday.astype(int)
+    flag((age < MIN_AGE) | (age > MAX_AGE), f'Age must be between {MIN_AGE} and {MAX_AGE}.')
+
+    flag(~df['gender'].isin(ALLOWED_GENDERS), 'Gender must be Male, Female, or Other.')
+
+    return df[errors.isna()], errors.dropna()
+
+
+def _insert_rows_individually(cursor, rows):
+    """
+    Insert rows one at a time, skipping any that violate a constraint.
+    Returns (inserted_rows, errors) with errors indexed like rows.
+    """
+    conflicts = []
+    for index, row in zip(rows.index, rows.to_dict('records')):
+        try:
+            cursor.execute(INSERT_PATIENT_SQL, row)
+        except sqlite3.IntegrityError:
+            conflicts.append(index)
+
+    errors = pd.Series(DUPLICATE_EMAIL_ERROR, index=conflicts, dtype=object)
+    return rows.drop(index=conflicts), errors
+
+
+def import_patients(source, file_format, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Stream patients from a CSV or Parquet file into patients_demographics.
+    Existing emails are fetched once up front, and each chunk of valid
+    rows is inserted in one transaction.
+
+    Returns a report dict: inserted, failed and errors, a list of
+    {"row", "email", "error"} with 1-based data row numbers.
+    """
+    report = {"inserted": 0, "failed": 0, "errors": []}
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT email FROM patients_demographics")
+        existing_emails = {row[0] for row in cursor.fetchall()}
+
+        row_offset = 0
+        for chunk in iter_import_chunks(source, file_format, chunk_size):
+            chunk = chunk.reset_index(drop=True)
+            valid, errors = validate_patient_frame(chunk, existing_emails)
+
+            try:
+                cursor.executemany(INSERT_PATIENT_SQL, valid.to_dict('records'))
+                conn.commit()
+            except sqlite3.IntegrityError:
+                # An email was registered after the chunk was validated,
+                # insert row by row to find out which rows clash
+                conn.rollback()
+                valid, conflicts = _insert_rows_individually(cursor, valid)
+                conn.commit()
+                errors = pd.concat([errors, conflicts]).sort_index()
+
+            existing_emails.update(valid['email'])
+            report["inserted"] += len(valid)
+            report["failed"] += len(errors)
+            for index, message in errors.items():
+                report["errors"].append({
+                    "row": row_offset + index + 1,
+                    "email": chunk.at[index, 'email'] if 'email' in chunk.columns else '',
+                    "error": message,
+                })
+            row_offset += len(chunk)
+
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Bulk import patients from a CSV or Parquet file.')
+    parser.add_argument('file', help='path to a .csv or .parquet file')
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+                        help=f'rows validated and inserted per transaction (default {IMPORT_CHUNK_SIZE})')
+    args = parser.parse_args()
+
+    result = import_patients(args.file, detect_import_format(args.file), chunk_size=args.chunk_size)
+    for error in result["errors"]:
+        print(f"row {error['row']} ({error['email']}): {error['error']}")
+    print(f"Imported {result['inserted']} patients, {result['failed']} rows failed.")
@@ -0,0 +1,84 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.patients import get_patient_by_id, get_patient_assessments_page
+from utils.metrics import request_stats
+from utils.query_log import request_queries
+
+# Shared pool for the patient page lookups. Worker threads have no Flask
+# app context, so SQLite lookups there use their own short-lived connection.
+# They only inherit the request's metrics and query log, see _worker_context.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PATIENT_VIEW_WORKERS', 8)),
+    thread_name_prefix='patient-view',
+)
+
+
+def get_emergency_contacts(emergency_contact_coll, patient_id):
+    """
+    Fetch the emergency contacts for a given patient from the database.
+    """
+    if emergency_contact_coll is not None:
+        return list(emergency_contact_coll.find({"patient_id": patient_id}))
+    return []
+
+
+def _timed(fn, *args, **kwargs):
+    """Run fn and return (result, elapsed milliseconds)."""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def _worker_context():
+    """
+    A fresh context holding only the request's metrics and query log.
+    Copying the whole context would carry Flask's app context along, and
+    the worker would then share the request thread's SQLite connection,
+    which sqlite3 refuses to use from another thread.
+    """
+    context = contextvars.Context()
+    for var in (request_stats, request_queries):
+        context.run(var.set, var.get())
+    return context
+
+
+def _submit_timed(fn, *args, **kwargs):
+    """Run fn through _timed on the pool, with its queries counted against the request."""
+    return _executor.submit(_worker_context().run, _timed, fn, *args, **kwargs)
+
+
+def load_patient_detail(patient_id, patient_assessments_collection, emergency_contact_coll,
+                        assessments_cursor=None):
+    """
+    Load everything the patient page shows. The SQLite patient lookup and
+    the two MongoDB lookups are independent, so they run concurrently and
+    the page waits for the slowest one rather than the sum of all three.
+
+    Returns a dict with patient, assessments, next_assessments_cursor,
+    emergency_contacts and timings (milliseconds per source).
+    Raises ValueError for an invalid assessments cursor.
+    """
+    patient_future = _submit_timed(get_patient_by_id, patient_id)
+    assessments_future = _submit_timed(
+        get_patient_assessments_page,
+        patient_assessments_collection, patient_id, cursor=assessments_cursor
+    )
+    contacts_future = _submit_timed(get_emergency_contacts, emergency_contact_coll, patient_id)
+
+    patient, patient_ms = patient_future.result()
+    (assessments, next_cursor), assessments_ms = assessments_future.result()
+    emergency_contacts, contacts_ms = contacts_future.result()
+
+    return {
+        "patient": patient,
+        "assessments": assessments,
+        "next_assessments_cursor": next_cursor,
+        "emergency_contacts": emergency_contacts,
+        "timings": {
+            "patient": patient_ms,
+            "assessments": assessments_ms,
+            "emergency_contacts": contacts_ms,
+        },
+    }
@@ -1,24 +1,37 @@
 import sqlite3
-from utils.init_db import db_name
+from utils.init_db import db_connection
+from utils.pagination import keyset_query, keyset_page
+from utils.statistics import get_counters, get_assessment_count
 from models.patients import Patient
 import re
-from flask import flash
 from datetime import datetime, date
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Validation rules shared by validate_patient_data and the bulk import
+EMAIL_PATTERN = r'^[\w\.-]+@[\w\.-]+\.\w+$'
+ALLOWED_GENDERS = ['male', 'female', 'other']
+MIN_AGE = 0
+MAX_AGE = 120
+
+# Search words shorter than this are matched as whole words rather than as
+# prefixes, and at most SEARCH_CANDIDATES of the newest matches are ranked
+SEARCH_MIN_PREFIX = 3
+SEARCH_CANDIDATES = 5000
 
 def get_patient_by_id(id):
     """
     Fetch a patient from the database using their patient ID.
     """
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
-
-    cursor.execute('''
-    SELECT id, first_name, last_name, email, date_of_birth, gender, source_row_id, created_at
-    FROM patients_demographics
-    WHERE id = ?
-    ''', (id,))
-    row = cursor.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+        SELECT id, first_name, last_name, email, date_of_birth, gender, source_row_id, created_at
+        FROM patients_demographics
+        WHERE id = ?
+        ''', (id,))
+        row = cursor.fetchone()
     if row:
         return Patient(*row)
 
@@ -27,15 +40,14 @@ def get_all_patients():
     """
     Fetch all patients from the database.
     """
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute('''
-        SELECT id, first_name, last_name, email, date_of_birth, gender, source_row_id, created_at
-        FROM patients_demographics
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
+        cursor.execute('''
+            SELECT id, first_name, last_name, email, date_of_birth, gender, source_row_id, created_at
+            FROM patients_demographics
+        ''')
+        rows = cursor.fetchall()
 
     patients = []
     for r in rows:
@@ -56,23 +68,21 @@ def get_patients_paginated(page=1, per_page=20):
     Fetch patients with pagination.
     Returns (patients_list, total_pages).
     """
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
+    total_patients = get_counters('patients')['patients']
 
-    cursor.execute("SELECT COUNT(*) FROM patients_demographics")
-    total_patients = cursor.fetchone()[0]
+    with db_connection() as conn:
+        cursor = conn.cursor()
 
-    # Calculate LIMIT / OFFSET
-    offset = (page - 1) * per_page
+        # Calculate LIMIT / OFFSET
+        offset = (page - 1) * per_page
 
-    cursor.execute('''
-        SELECT id, first_name, last_name, email, date_of_birth, gender, source_row_id, created_at
-        FROM patients_demographics
-        ORDER BY created_at DESC
-        LIMIT ? OFFSET ?
-    ''', (per_page, offset))
-    rows = cursor.fetchall()
-    conn.close()
+        cursor.execute('''
+            SELECT id, first_name, last_name, email, date_of_birth, gender, source_row_id, created_at
+            FROM patients_demographics
+            ORDER BY created_at DESC, id DESC
+            LIMIT ? OFFSET ?
+        ''', (per_page, offset))
+        rows = cursor.fetchall()
 
     patients = []
     for r in rows:
@@ -96,22 +106,116 @@ def get_patients_paginated(page=1, per_page=20):
     return patients, total_pages
 
 
-    
-def get_patients_statistics(assessments=None):
+def get_patients_by_cursor(cursor=None, per_page=20):
     """
-    Get statistics about patients_demographics in the system.
+    Fetch patients with keyset pagination on (created_at, id).
+    Unlike LIMIT / OFFSET the cost does not grow with how deep the page is.
+    Returns (patients_list, next_cursor, prev_cursor, total_patients).
     """
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
+    base_sql = '''
+        SELECT id, first_name, last_name, email, date_of_birth, gender, source_row_id, created_at
+        FROM patients_demographics
+    '''
+    sql, params, direction = keyset_query(base_sql, cursor, per_page)
 
-    cursor.execute("SELECT COUNT(*) FROM patients_demographics")
-    total_patients = cursor.fetchone()[0]
+    with db_connection() as conn:
+        db_cursor = conn.cursor()
 
-    conn.close()
-    
-    assessment_count = 0
-    if assessments is not None:
-        assessment_count = assessments.count_documents({})
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    total_patients = get_counters('patients')['patients']
+
+    rows, next_cursor, prev_cursor = keyset_page(
+        rows, cursor, direction, per_page, key=lambda r: (r[7], r[0])
+    )
+
+    patients = []
+    for r in rows:
+        patients.append({
+            'id': r[0],
+            'first_name': r[1],
+            'last_name': r[2],
+            'email': r[3],
+            'date_of_birth': r[4],
+            'gender': r[5],
+            'source_row_id': r[6],
+            'created_at': r[7]
+        })
+
+    return patients, next_cursor, prev_cursor, total_patients
+
+
+def build_search_query(text):
+    """
+    Turn free text into an FTS5 query, e.g. 'jo smi' -> '"jo" "smi"*'.
+    Words of SEARCH_MIN_PREFIX letters or more match as prefixes, shorter ones
+    as whole words. Email domains are dropped since only the part before the @
+    is indexed. Each word is quoted so FTS5 operators typed by the user are
+    matched literally. Returns None if the text has no searchable words.
+    """
+    terms = re.findall(r'\w+', re.sub(r'@\S*', ' ', text or ''))
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' if len(term) >= SEARCH_MIN_PREFIX else f'"{term}"' for term in terms)
+
+
+def search_patients(text, limit=20):
+    """
+    Search patients by first name, last name and the local part of their
+    email through the patients_fts index. Best matches first.
+    Returns a list of patient dicts.
+    """
+    match = build_search_query(text)
+    if match is None:
+        return []
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        # bm25 scores only the newest SEARCH_CANDIDATES matches, so a broad word
+        # such as a common first name costs the same as a narrow one. Only the
+        # best `limit` of them are joined to patients_demographics.
+        cursor.execute('''
+            SELECT p.id, p.first_name, p.last_name, p.email, p.date_of_birth, p.gender, p.source_row_id, p.created_at
+            FROM (
+                SELECT rowid, score
+                FROM (
+                    SELECT rowid, bm25(patients_fts) AS score
+                    FROM patients_fts
+                    WHERE patients_fts MATCH ?
+                    ORDER BY rowid DESC
+                    LIMIT ?
+                )
+                ORDER BY score
+                LIMIT ?
+            ) AS matches
+            JOIN patients_demographics p ON p.id = matches.rowid
+            ORDER BY matches.score, p.id
+        ''', (match, SEARCH_CANDIDATES, limit))
+        rows = cursor.fetchall()
+
+    patients = []
+    for r in rows:
+        patients.append({
+            'id': r[0],
+            'first_name': r[1],
+            'last_name': r[2],
+            'email': r[3],
+            'date_of_birth': r[4],
+            'gender': r[5],
+            'source_row_id': r[6],
+            'created_at': r[7]
+        })
+
+    return patients
+
+
+def get_patients_statistics(assessments=None):
+    """
+    Get statistics about patients_demographics in the system.
+    """
+    total_patients = get_counters('patients')['patients']
+    assessment_count = get_assessment_count(assessments)
     
     return  [
     {
@@ -136,16 +240,15 @@ def register_patient(first_name, last_name, email, date_of_birth, gender):
         raise ValueError('All fields are required. Please fill out all fields.')
     
     try:
-        conn = sqlite3.connect(db_name())
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        INSERT INTO patients_demographics (first_name, last_name, email, date_of_birth, gender, source_row_id)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ''', (first_name, last_name, email, date_of_birth, gender, None))
+        with db_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+            INSERT INTO patients_demographics (first_name, last_name, email, date_of_birth, gender, source_row_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', (first_name, last_name, email, date_of_birth, gender, None))
 
-        conn.commit()
-        conn.close()
+            conn.commit()
         return True
     
     except sqlite3.IntegrityError:
@@ -157,11 +260,10 @@ def validate_patient_data(email=None, date_of_birth=None, gender=None):
     It raises ValueError with appropriate message if validation fails.
    
     """
-    try:
-        conn = sqlite3.connect(db_name())
+    with db_connection() as conn:
         cursor = conn.cursor()
-        
-        
+
+
         if email:
             cursor.execute('''
             SELECT 1
@@ -170,26 +272,23 @@ def validate_patient_data(email=None, date_of_birth=None, gender=None):
             ''', (email,))
             if cursor.fetchone(): 
                 raise ValueError('Email already registered. Please use a different email')
-            
+
             # Email pattern validation
-            email_pattern = r'^[\w\.-]+@[\w\.-]+\.\w+$'
-            if not re.match(email_pattern, email):
+            if not re.match(EMAIL_PATTERN, email):
                 raise ValueError('Please enter a valid email address') 
-    
+
 
         if date_of_birth:
             # Calculate age from date_of_birth
             dob = datetime.strptime(date_of_birth, '%Y-%m-%d').date()
             today = date.today()
             age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-            if age < 0 or age > 120:
-                raise ValueError('Age must be between 0 and 120.')
-        
+            if age < MIN_AGE or age > MAX_AGE:
+                raise ValueError(f'Age must be between {MIN_AGE} and {MAX_AGE}.')
+
         if gender:
-            if gender not in ['male', 'female', 'other']:
+            if gender not in ALLOWED_GENDERS:
                 raise ValueError('Gender must be Male, Female, or Other.')
-    finally:
-        conn.close()
         
     
 def update_patient(id, first_name, last_name, date_of_birth, gender):
@@ -201,15 +300,14 @@ def update_patient(id, first_name, last_name, date_of_birth, gender):
         raise ValueError('All fields are required. Please fill out all fields.')
     
     try:
-        conn = sqlite3.connect(db_name())
-        cursor = conn.cursor()
-        cursor.execute('''
-        UPDATE patients_demographics
-        SET first_name = ?, last_name = ?, date_of_birth = ?, gender = ?
-        WHERE id = ?
-        ''', ( first_name, last_name, date_of_birth, gender, id))
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+            UPDATE patients_demographics
+            SET first_name = ?, last_name = ?, date_of_birth = ?, gender = ?
+            WHERE id = ?
+            ''', ( first_name, last_name, date_of_birth, gender, id))
+            conn.commit()
         return True
     except sqlite3.IntegrityError:
         raise ValueError('Failed to update patient information.')
@@ -230,16 +328,15 @@ def delete_patient(id, assessment_collection=None):
     
     # Then delete from SQLite
     try:
-        conn = sqlite3.connect(db_name())
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        DELETE FROM patients_demographics
-        WHERE id = ?
-        ''', (id,))
-        
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+            DELETE FROM patients_demographics
+            WHERE id = ?
+            ''', (id,))
+
+            conn.commit()
     except Exception as e:
         raise ValueError(f"Failed to delete patient: {e}")
 
@@ -252,7 +349,8 @@ def validate_patient_assessment_data( work_type,
     smoking_status, stroke_status):
 
     """
-    Validate patient assessment form data.
+    Validate patient assessment form data. bmi may be None when it was
+    not measured, the risk model imputes it.
     Raise ValueError if there is an error.
     """
 
@@ -289,14 +387,14 @@ def validate_patient_assessment_data( work_type,
 
     try:
         avg_glucose_level = float(avg_glucose_level)
-        bmi = float(bmi)
+        bmi = float(bmi) if bmi is not None else None
     except ValueError:
         raise ValueError("Average glucose level and BMI must be valid numbers.")
 
     if not (40 <= avg_glucose_level <= 400):
         raise ValueError("Average glucose level should be between 40 and 400 mg/dL.")
 
-    if not (10 <= bmi <= 80):
+    if bmi is not None and not (10 <= bmi <= 80):
         raise ValueError("BMI should be between 10 and 80.")
 
     return {
@@ -310,14 +408,48 @@ def validate_patient_assessment_data( work_type,
         "stroke_status": stroke_status,
     }
 
-def get_patient_assessments_history(assessment, patient_id):
+# Only the fields rendered in the assessment history table
+ASSESSMENT_HISTORY_FIELDS = {
+    "work_type": 1,
+    "ever_married": 1,
+    "residence_type": 1,
+    "hypertensiv_status": 1,
+    "avg_glucose_level": 1,
+    "bmi": 1,
+    "smoking_status": 1,
+    "stroke_status": 1,
+    "risk_score": 1,
+}
+
+def get_patient_assessments_page(assessment, patient_id, cursor=None, per_page=10):
     """
-    Fetch all assessments for a given patient from the database.
+    Fetch one page of a patient's assessments, newest first.
+    Pages on _id, which grows with insertion time and is unique, so the
+    order is stable even for assessments recorded in the same instant.
+    cursor is the _id of the last assessment on the previous page.
+    Returns (assessments_list, next_cursor).
     """
-    if assessment is not None:
-        assessments = assessment.find({"patient_id": patient_id}).sort("date", -1)
-        return list(assessments)
-    return []
+    if assessment is None:
+        return [], None
+
+    query = {"patient_id": patient_id}
+    if cursor:
+        try:
+            query["_id"] = {"$lt": ObjectId(cursor)}
+        except InvalidId:
+            raise ValueError("Invalid assessment cursor.")
+
+    # Fetch one extra to know if there is another page
+    assessments = list(
+        assessment.find(query, ASSESSMENT_HISTORY_FIELDS).sort("_id", -1).limit(per_page + 1)
+    )
+
+    next_cursor = None
+    if len(assessments) > per_page:
+        assessments = assessments[:per_page]
+        next_cursor = str(assessments[-1]["_id"])
+
+    return assessments, next_cursor
 
 def validate_emergency_contact_data(first_name, last_name, phone_number, relationship):
     """
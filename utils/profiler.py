@@ -0,0 +1,228 @@
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from flask import g, request
+from utils.auth import get_current_user
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILE_PARAM = 'profile'
+PROFILE_HEADER = 'X-Profile'
+
+# Only one request per process is profiled at a time
+_profiling_lock = threading.Lock()
+
+
+def profile_dir():
+    return os.environ.get('PROFILE_DIR', 'instance/profiles')
+
+
+def _secret():
+    secret = os.environ.get('FLASK_SECRET_KEY')
+    if not secret:
+        raise ValueError('FLASK_SECRET_KEY must be set to sign profiling links.')
+    return secret.encode()
+
+
+def _signature(path, expires):
+    return hmac.new(_secret(), f'{path}|{expires}'.encode(), hashlib.sha256).hexdigest()
+
+
+def sign_profile_token(path, max_age=None):
+    """A token that profiles requests to path until it expires, e.g. '1760000000.3f9a...'."""
+    if max_age is None:
+        max_age = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 900))
+    expires = int(time.time()) + max_age
+    return f'{expires}.{_signature(path, expires)}'
+
+
+def verify_profile_token(token, path):
+    """True if token was signed for path and has not expired."""
+    expires, _, signature = (token or '').partition('.')
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    try:
+        return hmac.compare_digest(signature, _signature(path, int(expires)))
+    except (TypeError, ValueError):
+        # No FLASK_SECRET_KEY, or a signature that is not even ASCII
+        return False
+
+
+class RequestProfiler:
+    """
+    Records every Python and C function call on the current thread with
+    sys.setprofile and writes them as a speedscope evented profile, which
+    shows as a flame chart at https://www.speedscope.app. Jinja compiles
+    each template to code that keeps the template's filename, so rendering
+    shows up under templates/pages/... alongside the utils/ functions.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.max_events = int(os.environ.get('PROFILE_MAX_EVENTS', 2000000))
+        self.frames = []
+        self.frame_index = {}
+        self.events = []
+        self.stack = []
+        self.started = None
+
+    def _frame(self, key, name, file, line):
+        index = self.frame_index.get(key)
+        if index is None:
+            index = self.frame_index[key] = len(self.frames)
+            self.frames.append({'name': name, 'file': file, 'line': line})
+        return index
+
+    def _code_frame(self, code):
+        filename = code.co_filename
+        if filename.startswith(ROOT_DIR):
+            filename = os.path.relpath(filename, ROOT_DIR)
+        name = getattr(code, 'co_qualname', code.co_name)
+        return self._frame(code, name, filename, code.co_firstlineno)
+
+    def _builtin_frame(self, fn):
+        name = getattr(fn, '__qualname__', repr(fn))
+        module = getattr(fn, '__module__', None)
+        if module:
+            name = f'{module}.{name}'
+        return self._frame(name, name, '<built-in>', 0)
+
+    def _now(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def _trace(self, frame, event, arg):
+        if event == 'call':
+            index = self._code_frame(frame.f_code)
+        elif event == 'c_call':
+            index = self._builtin_frame(arg)
+        elif self.stack:
+            # return, c_return or c_exception closes the innermost open frame
+            self.events.append({'type': 'C', 'frame': self.stack.pop(), 'at': self._now()})
+            return
+        else:
+            # Returning from a frame entered before profiling started
+            return
+
+        self.stack.append(index)
+        self.events.append({'type': 'O', 'frame': index, 'at': self._now()})
+        if len(self.events) >= self.max_events:
+            sys.setprofile(None)
+
+    def start(self):
+        self.started = time.perf_counter()
+        sys.setprofile(self._trace)
+
+    def stop(self):
+        sys.setprofile(None)
+        end = self._now()
+        # Close anything still open, the profiled code returns after we stopped
+        while self.stack:
+            self.events.append({'type': 'C', 'frame': self.stack.pop(), 'at': end})
+        return end
+
+    def speedscope(self, end):
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': self.name,
+            'exporter': 'neuropredict',
+            'activeProfileIndex': 0,
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'evented',
+                'name': self.name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': end,
+                'events': self.events,
+            }],
+        }
+
+
+def profile_filename():
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    return f'{stamp}-{slug}-{os.getpid()}.speedscope.json'
+
+
+def list_profiles():
+    """Saved profiles, newest first, as dicts with name, size and modified time."""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith('.speedscope.json'):
+            stat = os.stat(os.path.join(directory, name))
+            profiles.append({
+                'name': name,
+                'size_kb': round(stat.st_size / 1024, 1),
+                'modified': datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+            })
+    return sorted(profiles, key=lambda p: p['modified'], reverse=True)
+
+
+def _profile_requested():
+    token = request.args.get(PROFILE_PARAM) or request.headers.get(PROFILE_HEADER)
+    if not token or not verify_profile_token(token, request.path):
+        return False
+    current_user = get_current_user()
+    return bool(current_user and current_user.is_super_admin())
+
+
+def init_profiler(app):
+    """
+    Profile a request when it carries a signed ?profile= parameter or
+    X-Profile header and comes from a super admin. Other requests only
+    pay for looking the parameter up.
+    """
+    @app.before_request
+    def start_profiler():
+        if PROFILE_PARAM not in request.args and PROFILE_HEADER not in request.headers:
+            return
+        if not _profile_requested():
+            return
+        if not _profiling_lock.acquire(blocking=False):
+            print(f"Skipped profiling {request.path}, another request is being profiled")
+            return
+        g.profile_file = profile_filename()
+        g.profiler = RequestProfiler(f'{request.method} {request.full_path}')
+        g.profiler.start()
+
+    @app.after_request
+    def add_profile_header(response):
+        if 'profile_file' in g:
+            response.headers['X-Profile-File'] = g.profile_file
+        return response
+
+    @app.teardown_request
+    def finish_profiler(exception=None):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return
+        try:
+            end = profiler.stop()
+            os.makedirs(profile_dir(), exist_ok=True)
+            path = os.path.join(profile_dir(), g.profile_file)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(profiler.speedscope(end), f)
+            print(f"Profile of {request.path} written to {path}")
+        except OSError as e:
+            print(f"Failed to write profile: {e}")
+        finally:
+            _profiling_lock.release()
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Print a signed link that profiles one page.')
+    parser.add_argument('path', help='page path, e.g. /users-management')
+    parser.add_argument('--max-age', type=int, help='seconds the link stays valid (default PROFILE_TOKEN_MAX_AGE or 900)')
+    args = parser.parse_args()
+    print(f'{args.path}?{PROFILE_PARAM}={sign_profile_token(args.path, args.max_age)}')
@@ -0,0 +1,306 @@
+import contextvars
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from flask import g, request
+from pymongo import monitoring
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Frames in these files are plumbing, the call site is the first frame outside them
+_SKIP_FILES = {os.path.join(ROOT_DIR, 'utils', name) for name in ('query_log.py', 'init_db.py', 'mongo.py')}
+
+# Driver commands that are not application queries
+_IGNORED_COMMANDS = {'hello', 'isMaster', 'ismaster', 'ping', 'saslStart', 'saslContinue',
+                     'endSessions', 'killCursors', 'buildInfo'}
+
+MAX_OFFENDERS = 500
+
+# Queries run by the request being served, None outside requests or with diagnostics off
+request_queries = contextvars.ContextVar('request_queries', default=None)
+
+_offenders = {}
+_flagged_requests = deque(maxlen=50)
+_offenders_lock = threading.Lock()
+_slow_log_lock = threading.Lock()
+_pending_commands = {}
+
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SQL_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def diagnostics_enabled():
+    """QUERY_DIAGNOSTICS=1 records every SQLite and MongoDB query with its call site."""
+    return os.environ.get('QUERY_DIAGNOSTICS', '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+def slow_query_ms():
+    return float(os.environ.get('QUERY_SLOW_MS', 100))
+
+
+def repeat_threshold():
+    return int(os.environ.get('QUERY_REPEAT_THRESHOLD', 3))
+
+
+def sql_shape(statement):
+    """The statement with literals and IN lists replaced, so the same query with other values matches."""
+    shape = _SQL_STRING.sub('?', statement)
+    shape = _SQL_NUMBER.sub('?', shape)
+    shape = _SQL_LIST.sub('(?)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def _value_shape(value):
+    if isinstance(value, dict):
+        return {key: _value_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        # An $in list collapses to one placeholder, a pipeline keeps each stage's shape
+        shapes = [_value_shape(item) for item in value]
+        return shapes if any(isinstance(item, (dict, list)) for item in value) else ['?']
+    return '?'
+
+
+def mongo_shape(command_name, command):
+    """'find patient_assessments {"patient_id": "?"}': command, collection and filter with the values replaced."""
+    collection = command.get(command_name)
+    if command_name == 'getMore':
+        collection = command.get('collection')
+    shape = f"{command_name} {collection}"
+    for key in ('filter', 'query', 'pipeline', 'updates', 'deletes'):
+        if key in command:
+            return shape + ' ' + json.dumps(_value_shape(command[key]), sort_keys=True, default=str)
+    return shape
+
+
+def call_site():
+    """'utils/patients.py:88 get_patient_by_id < routes/patient_routes.py:150 patient_info', innermost first."""
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < 2:
+        filename = frame.f_code.co_filename
+        if filename.startswith(ROOT_DIR) and filename not in _SKIP_FILES and 'site-packages' not in filename:
+            frames.append(f"{os.path.relpath(filename, ROOT_DIR)}:{frame.f_lineno} {frame.f_code.co_name}")
+        frame = frame.f_back
+    return ' < '.join(frames) or '<unknown>'
+
+
+def _request_fields():
+    try:
+        return {'endpoint': request.url_rule.rule if request.url_rule else '<unmatched>',
+                'method': request.method, 'path': request.path}
+    except RuntimeError:
+        # Outside a request, e.g. seeding or a background thread
+        return {'endpoint': None}
+
+
+def _write_slow_log(entry):
+    path = os.environ.get('QUERY_SLOW_LOG', 'instance/slow_queries.log')
+    line = json.dumps(entry, default=str)
+    try:
+        with _slow_log_lock:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+    except OSError as e:
+        print(f"Failed to write slow query log: {e}")
+
+
+def _offender(kind, shape, site, endpoint):
+    """The aggregate entry for a query shape, created on first sight. Call with _offenders_lock held."""
+    key = (kind, shape)
+    entry = _offenders.get(key)
+    if entry is None:
+        if len(_offenders) >= MAX_OFFENDERS:
+            del _offenders[min(_offenders, key=lambda k: _offenders[k]['total_ms'])]
+        entry = _offenders[key] = {'kind': kind, 'shape': shape, 'call_site': site, 'endpoint': endpoint,
+                                   'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'slow': 0,
+                                   'repeated_requests': 0, 'max_repeats': 0}
+    return entry
+
+
+def record_query(kind, shape, duration_ms, site):
+    """Add one finished query to the request's list and the aggregates, and log it if slow."""
+    queries = request_queries.get()
+    if queries is not None:
+        queries.append({'kind': kind, 'shape': shape, 'ms': duration_ms, 'call_site': site})
+
+    slow = duration_ms >= slow_query_ms()
+    if queries is None and not slow:
+        return
+
+    fields = _request_fields()
+    with _offenders_lock:
+        entry = _offender(kind, shape, site, fields['endpoint'])
+        entry['count'] += 1
+        entry['total_ms'] += duration_ms
+        entry['max_ms'] = max(entry['max_ms'], duration_ms)
+        if slow:
+            entry['slow'] += 1
+
+    if slow:
+        _write_slow_log({'at': datetime.now(timezone.utc).isoformat(), 'event': 'slow_query', 'kind': kind,
+                         'duration_ms': round(duration_ms, 2), 'shape': shape, 'call_site': site,
+                         'pid': os.getpid(), **fields})
+
+
+class DiagnosticCursor(sqlite3.Cursor):
+    """Times execute/executemany. For a SELECT that covers the work up to the first row."""
+    def execute(self, sql, parameters=()):
+        if not self.connection.recording:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query('sqlite', sql_shape(sql), (time.perf_counter() - started) * 1000, call_site())
+
+    def executemany(self, sql, seq_of_parameters):
+        if not self.connection.recording:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query('sqlite', sql_shape(sql), (time.perf_counter() - started) * 1000, call_site())
+
+
+class DiagnosticConnection(sqlite3.Connection):
+    """
+    Connection whose statements all go through DiagnosticCursor.
+    Nothing is recorded until start_recording, so the connection
+    setup pragmas stay out of the diagnostics.
+    """
+    recording = False
+
+    def cursor(self, factory=DiagnosticCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def start_recording(self):
+        self.recording = True
+
+
+def sqlite_connection_class():
+    """The class get_db_connection opens connections with, plain sqlite3.Connection unless diagnostics are on."""
+    return DiagnosticConnection if diagnostics_enabled() else sqlite3.Connection
+
+
+class MongoQueryDiagnostics(monitoring.CommandListener):
+    """Records MongoDB commands alongside the SQLite queries, registered in mongo_client_options."""
+    def started(self, event):
+        if event.command_name in _IGNORED_COMMANDS or not diagnostics_enabled():
+            return
+        # Shape and call site are taken here, where the stack still shows who sent the command
+        _pending_commands[event.request_id] = (mongo_shape(event.command_name, event.command), call_site())
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        pending = _pending_commands.pop(event.request_id, None)
+        if pending is not None:
+            shape, site = pending
+            record_query('mongo', shape, event.duration_micros / 1000, site)
+
+
+def repeated_queries(queries, threshold):
+    """Query shapes run at least threshold times in one request: the N+1 suspects."""
+    counts = Counter((query['kind'], query['shape']) for query in queries)
+    sites = {(query['kind'], query['shape']): query['call_site'] for query in queries}
+    return [{'kind': kind, 'shape': shape, 'times': times, 'call_site': sites[(kind, shape)]}
+            for (kind, shape), times in counts.most_common() if times >= threshold]
+
+
+def _finish_request(queries):
+    repeated = repeated_queries(queries, repeat_threshold())
+    if not repeated:
+        return
+
+    fields = _request_fields()
+    with _offenders_lock:
+        for item in repeated:
+            entry = _offender(item['kind'], item['shape'], item['call_site'], fields['endpoint'])
+            entry['repeated_requests'] += 1
+            entry['max_repeats'] = max(entry['max_repeats'], item['times'])
+        _flagged_requests.appendleft({
+            'at': datetime.now(timezone.utc).isoformat(), **fields,
+            'queries': len(queries), 'total_ms': round(sum(query['ms'] for query in queries), 2),
+            'repeated': repeated,
+        })
+
+    _write_slow_log({'at': datetime.now(timezone.utc).isoformat(), 'event': 'repeated_queries',
+                     'queries': len(queries), 'repeated': repeated, 'pid': os.getpid(), **fields})
+
+
+def get_query_diagnostics(limit=25):
+    """The worst query shapes and the latest requests flagged with repeated queries, for this process."""
+    with _offenders_lock:
+        offenders = [dict(entry, total_ms=round(entry['total_ms'], 2), max_ms=round(entry['max_ms'], 2),
+                          avg_ms=round(entry['total_ms'] / entry['count'], 2) if entry['count'] else 0.0)
+                     for entry in _offenders.values()]
+        flagged = list(_flagged_requests)
+    return {
+        'enabled': diagnostics_enabled(),
+        'slow_ms': slow_query_ms(),
+        'repeat_threshold': repeat_threshold(),
+        'slowest': sorted(offenders, key=lambda e: e['total_ms'], reverse=True)[:limit],
+        'repeated': sorted((e for e in offenders if e['repeated_requests']),
+                           key=lambda e: (e['repeated_requests'], e['max_repeats']), reverse=True)[:limit],
+        'flagged_requests': flagged,
+    }
+
+
+def init_query_log(app):
+    """Register the hooks that collect each request's queries when QUERY_DIAGNOSTICS is on."""
+    @app.before_request
+    def start_query_log():
+        if diagnostics_enabled():
+            request_queries.set([])
+
+    @app.teardown_request
+    def finish_query_log(exception=None):
+        # Teardown rather than after_request, so requests that raised are logged too
+        queries = request_queries.get()
+        if queries is not None:
+            request_queries.set(None)
+            # A streamed body is generated after teardown, stream_with_query_log finishes those
+            if not g.get('query_log_streaming'):
+                _finish_request(queries)
+
+
+def stream_with_query_log(chunks):
+    """
+    Wrap a streamed response body so the queries made while it is generated
+    are logged with the request. Flask tears the request down as soon as the
+    view returns, before the body is streamed. Wrap the result in
+    stream_with_context, so the request is still available for the log.
+    """
+    queries = request_queries.get()
+    if queries is None:
+        return chunks
+    g.query_log_streaming = True
+
+    def generate():
+        request_queries.set(queries)
+        try:
+            yield from chunks
+        finally:
+            request_queries.set(None)
+            _finish_request(queries)
+
+    return generate()
@@ -0,0 +1,298 @@
+import time
+from datetime import date, datetime, timezone
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+from utils.init_db import db_connection
+from utils.model_registry import ModelRegistry
+
+DATASET_PATH = 'csv/healthcare_dataset_stroke_data.csv'
+RESCORE_BATCH_SIZE = 10000
+
+NUMERIC_FEATURES = ['age', 'avg_glucose_level', 'bmi', 'hypertensiv_status']
+
+# One-hot levels per categorical field, after normalize_category
+CATEGORY_LEVELS = {
+    'gender': ['male', 'female'],
+    'ever_married': ['yes'],
+    'residence_type': ['urban'],
+    'work_type': ['private', 'self employed', 'govt job', 'never worked', 'children'],
+    'smoking_status': ['formerly smoked', 'never smoked', 'smokes', 'unknown'],
+}
+
+FEATURE_NAMES = NUMERIC_FEATURES + [
+    f'{field}={level}' for field, levels in CATEGORY_LEVELS.items() for level in levels
+]
+
+
+def normalize_category(value):
+    """
+    Bring dataset and form spellings together,
+    e.g. 'Self-employed' and 'self employed', 'Govt_job' and 'govt job'.
+    """
+    if value is None:
+        return ''
+    return str(value).strip().lower().replace('-', ' ').replace('_', ' ')
+
+
+def _one_hot(field, value):
+    value = normalize_category(value)
+    return [1.0 if value == level else 0.0 for level in CATEGORY_LEVELS[field]]
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def age_from_dob(date_of_birth, today=None):
+    """Age in whole years from a YYYY-MM-DD date of birth."""
+    today = today or date.today()
+    dob = datetime.strptime(str(date_of_birth), '%Y-%m-%d').date()
+    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+
+def encode_record(record):
+    """
+    Feature vector for one record, a dict holding the NUMERIC_FEATURES
+    and CATEGORY_LEVELS fields. Missing numbers are left as NaN.
+    """
+    row = [_to_float(record.get(name)) for name in NUMERIC_FEATURES]
+    for field in CATEGORY_LEVELS:
+        row.extend(_one_hot(field, record.get(field)))
+    return np.array(row, dtype=np.float64)
+
+
+def encode_frame(df):
+    """
+    Vectorized encode_record for a DataFrame with the same fields.
+    Each categorical column is factorized and only its distinct values go
+    through the scalar encoder, so both paths produce identical features.
+    Missing columns are treated as missing values.
+    """
+    df = df.reindex(columns=NUMERIC_FEATURES + list(CATEGORY_LEVELS))
+    columns = [pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64)
+               for name in NUMERIC_FEATURES]
+    blocks = [np.column_stack(columns)]
+
+    for field in CATEGORY_LEVELS:
+        codes, uniques = pd.factorize(df[field], use_na_sentinel=True)
+        table = np.array([_one_hot(field, value) for value in uniques] + [_one_hot(field, None)],
+                         dtype=np.float64).reshape(len(uniques) + 1, len(CATEGORY_LEVELS[field]))
+        # -1 (missing) indexes the trailing all-zero row
+        blocks.append(table[codes])
+
+    return np.hstack(blocks)
+
+
+def _prepare(model, X):
+    """Fill missing values with the training means and standardize."""
+    X = np.where(np.isnan(X), model['fill'], X)
+    return (X - model['mean']) / model['std']
+
+
+def predict_proba(model, X):
+    """Stroke probability for each row of an encoded feature matrix."""
+    z = _prepare(model, X) @ model['weights'] + model['bias']
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def load_training_data(csv_path=DATASET_PATH):
+    """Encoded features and stroke labels from the stroke dataset CSV."""
+    df = pd.read_csv(csv_path, na_values=['N/A'])
+    df = df.rename(columns={'Residence_type': 'residence_type', 'hypertension': 'hypertensiv_status'})
+    return encode_frame(df), df['stroke'].to_numpy(dtype=np.float64)
+
+
+def train_model(csv_path=DATASET_PATH, l2=1.0, iterations=25):
+    """
+    Fit an L2-regularized logistic regression with Newton's method.
+    Classes are weighted to balance, as only ~5% of the rows had a stroke,
+    and the bias is shifted back afterwards so scores are probabilities
+    at the dataset's real stroke rate.
+    Returns the model as a dict of NumPy arrays.
+    """
+    X, y = load_training_data(csv_path)
+
+    fill = np.nanmean(X, axis=0)
+    X = np.where(np.isnan(X), fill, X)
+    mean = X.mean(axis=0)
+    std = X.std(axis=0)
+    std[std == 0] = 1.0
+    Xs = np.hstack([(X - mean) / std, np.ones((len(X), 1))])
+
+    positives = y.mean()
+    sample_weight = np.where(y == 1, 0.5 / positives, 0.5 / (1 - positives))
+
+    penalty = np.full(Xs.shape[1], l2)
+    penalty[-1] = 0.0  # the bias is not regularized
+    beta = np.zeros(Xs.shape[1])
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-(Xs @ beta)))
+        gradient = Xs.T @ (sample_weight * (p - y)) + penalty * beta
+        hessian = (Xs * (sample_weight * p * (1 - p))[:, None]).T @ Xs + np.diag(penalty)
+        step = np.linalg.solve(hessian, gradient)
+        beta -= step
+        if np.abs(step).max() < 1e-8:
+            break
+
+    # Undo the balancing's shift of the prior from 50% to the real stroke rate
+    beta[-1] += np.log(positives / (1 - positives))
+
+    return {
+        'trained_at': datetime.now(timezone.utc).isoformat(),
+        'feature_names': FEATURE_NAMES,
+        'fill': fill,
+        'mean': mean,
+        'std': std,
+        'weights': beta[:-1],
+        'bias': np.array(beta[-1]),
+    }
+
+
+def _check_features(model):
+    if list(model['feature_names']) != FEATURE_NAMES:
+        raise ValueError('Stroke risk model features do not match, retrain it.')
+
+
+registry = ModelRegistry('stroke_risk', validate=_check_features)
+
+
+def ensure_model():
+    """Train and publish a model if none has been published yet."""
+    if registry.current_version() is None:
+        started = time.perf_counter()
+        version = registry.publish(train_model())
+        print(f"Trained stroke risk model {version} in {time.perf_counter() - started:.2f}s")
+
+
+def get_model():
+    """The current model from the registry, trained first if none exists yet."""
+    model = registry.get()
+    if model is None:
+        ensure_model()
+        model = registry.get()
+    return model
+
+
+def warm_model():
+    """
+    Load the model and run one prediction, so the first assessment a
+    process handles does not pay for loading or first-call overhead.
+    """
+    try:
+        score_assessment({}, age=50, gender='female')
+    except Exception as e:
+        print(f"Stroke risk model warm-up failed: {e}")
+
+
+def score_assessment(assessment, age, gender, model=None):
+    """
+    Stroke probability for one assessment, used when it is saved.
+    age and gender come from the patient's demographics.
+    """
+    model = model or get_model()
+    started = time.perf_counter()
+    x = encode_record({**assessment, 'age': age, 'gender': gender})
+    score = float(predict_proba(model, x[None, :])[0])
+    registry.record_inference(time.perf_counter() - started)
+    return score
+
+
+def score_frame(df, model=None):
+    """Vectorized score_assessment for a DataFrame of assessments with age and gender."""
+    model = model or get_model()
+    started = time.perf_counter()
+    scores = predict_proba(model, encode_frame(df))
+    registry.record_inference(time.perf_counter() - started, rows=len(df))
+    return scores
+
+
+def get_patient_demographics():
+    """DataFrame of patient_id, age and gender for every patient, one SQLite query."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT id, date_of_birth, gender FROM patients_demographics")
+        rows = cursor.fetchall()
+
+    df = pd.DataFrame(rows, columns=['patient_id', 'date_of_birth', 'gender']).astype({'patient_id': 'int64'})
+    dob = pd.to_datetime(df['date_of_birth'], format='%Y-%m-%d', errors='coerce')
+    today = date.today()
+    before_birthday = (dob.dt.month > today.month) | ((dob.dt.month == today.month) & (dob.dt.day > today.day))
+    df['age'] = today.year - dob.dt.year - before_birthday.astype(int)
+    return df.drop(columns='date_of_birth')
+
+
+def rescore_assessments(patient_assessments_collection, batch_size=RESCORE_BATCH_SIZE):
+    """
+    Recompute risk_score on every assessment with the current model.
+    Assessments are read in batches, scored with one vectorized call per
+    batch and written back with one bulk_write per batch.
+    Returns (assessments rescored, seconds spent scoring).
+    """
+    model = get_model()
+    demographics = get_patient_demographics()
+
+    projection = {'patient_id': 1, **{field: 1 for field in NUMERIC_FEATURES + list(CATEGORY_LEVELS)
+                                      if field not in ('age', 'gender')}}
+    cursor = patient_assessments_collection.find({}, projection).batch_size(batch_size)
+
+    rescored = 0
+    scoring_seconds = 0.0
+
+    def flush(docs):
+        nonlocal rescored, scoring_seconds
+        batch = pd.DataFrame(docs).merge(demographics, on='patient_id', how='left')
+
+        started = time.perf_counter()
+        scores = score_frame(batch, model)
+        scoring_seconds += time.perf_counter() - started
+
+        patient_assessments_collection.bulk_write([
+            UpdateOne({'_id': _id}, {'$set': {'risk_score': float(score), 'risk_model_version': model['version']}})
+            for _id, score in zip(batch['_id'], scores)
+        ], ordered=False)
+        rescored += len(batch)
+
+    docs = []
+    for doc in cursor:
+        docs.append(doc)
+        if len(docs) == batch_size:
+            flush(docs)
+            docs = []
+    if docs:
+        flush(docs)
+
+    return rescored, scoring_seconds
+
+
+if __name__ == '__main__':
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Train the stroke risk model or rescore all assessments.')
+    parser.add_argument('command', choices=['train', 'rescore'])
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        started = time.perf_counter()
+        version = registry.publish(train_model())
+        print(f"Trained stroke risk model {version} in {time.perf_counter() - started:.2f}s, "
+              f"running app processes pick it up within {registry.reload_interval:g}s")
+    else:
+        from utils.mongo import mongo_configured, LazyCollection
+
+        if not mongo_configured():
+            raise SystemExit("MongoDB not configured, nothing to rescore.")
+
+        started = time.perf_counter()
+        count, scoring_seconds = rescore_assessments(LazyCollection("MONGODB_PATIENT_ASSESSMENTS_COLLECTION"))
+        elapsed = time.perf_counter() - started
+        rate = count / scoring_seconds if scoring_seconds else 0
+        print(f"Rescored {count} assessments in {elapsed:.2f}s "
+              f"(scoring {scoring_seconds:.2f}s, {rate:,.0f} assessments/s)")
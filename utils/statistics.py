@@ -0,0 +1,42 @@
+import os
+import time
+from utils.init_db import db_connection
+
+_assessment_count_cache = {}
+
+
+def get_counters(*names):
+    """
+    Read materialized counts from table_counters (kept current by triggers,
+    see utils/migrations.py) in one indexed lookup, whatever the table size.
+    Returns a dict of name -> value, 0 for any counter not yet created.
+    """
+    placeholders = ", ".join("?" for _ in names)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute(f"SELECT name, value FROM table_counters WHERE name IN ({placeholders})", names)
+        rows = dict(cursor.fetchall())
+
+    return {name: rows.get(name, 0) for name in names}
+
+
+def get_assessment_count(assessments):
+    """
+    Approximate number of assessment documents from collection metadata
+    (estimated_document_count) rather than scanning with count_documents.
+    Cached for STATS_MAX_AGE seconds, the staleness bound for the cards.
+    """
+    if assessments is None:
+        return 0
+
+    max_age = float(os.environ.get('STATS_MAX_AGE', 60))
+    now = time.monotonic()
+
+    cached = _assessment_count_cache.get(assessments.full_name)
+    if cached and now - cached[1] < max_age:
+        return cached[0]
+
+    count = assessments.estimated_document_count()
+    _assessment_count_cache[assessments.full_name] = (count, now)
+    return count
@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+# Token bucket per rule: "capacity/seconds", e.g. 20/60 allows a burst of
+# 20 attempts and then one more every 3 seconds
+DEFAULT_RULES = {
+    'login_ip': '20/60',
+    'login_email': '5/300',
+    'register_ip': '5/600',
+}
+
+# The memory backend forgets idle buckets once it tracks this many keys
+MAX_MEMORY_BUCKETS = 100000
+
+# Seconds between sweeps of refilled buckets from the SQLite backend, per process
+SQLITE_PURGE_INTERVAL = 60
+
+_counters = Counter()
+_counters_lock = threading.Lock()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_rule(name):
+    """(capacity, refill tokens per second) for a rule, overridable as THROTTLE_<NAME>."""
+    capacity, seconds = os.environ.get(f'THROTTLE_{name.upper()}', DEFAULT_RULES[name]).split('/')
+    return float(capacity), float(capacity) / float(seconds)
+
+
+def _refill(tokens, updated, now, capacity, rate):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBackend:
+    """Buckets in this process only, each worker throttles on its own."""
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, now, capacity, rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+
+            if len(self._buckets) > MAX_MEMORY_BUCKETS:
+                self._buckets = {k: v for k, v in self._buckets.items() if k == key or now - v[1] < 3600}
+
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+class SQLiteBackend:
+    """
+    Buckets in a small SQLite file shared by every worker on the host.
+    It is a separate file from the application database, so throttling
+    writes never queue behind application transactions. Each row records
+    when its bucket will be full again, a full bucket is the same as no
+    row, so rows past that time are deleted every SQLITE_PURGE_INTERVAL.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._next_purge = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with sqlite3.connect(path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS throttle_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                expires REAL NOT NULL
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_throttle_buckets_expires ON throttle_buckets (expires)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, capacity, rate):
+        # Wall-clock time, as monotonic clocks are not comparable across processes
+        now = time.time()
+        conn = self._connection()
+
+        # IMMEDIATE takes the write lock up front, so read-modify-write is atomic across workers
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM throttle_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(row[0], row[1], now, capacity, rate) if row else capacity
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute('''
+            INSERT INTO throttle_buckets (key, tokens, updated, expires) VALUES (?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated,
+                                           expires = excluded.expires
+            ''', (key, tokens, now, now + (capacity - tokens) / rate))
+
+            if now >= self._next_purge:
+                self._next_purge = now + SQLITE_PURGE_INTERVAL
+                conn.execute("DELETE FROM throttle_buckets WHERE expires <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+def get_backend():
+    """The configured backend, THROTTLE_BACKEND=memory (default) or sqlite."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if os.environ.get('THROTTLE_BACKEND', 'memory') == 'sqlite':
+                    _backend = SQLiteBackend(os.environ.get('THROTTLE_DB_PATH', 'instance/throttle.db'))
+                else:
+                    _backend = MemoryBackend()
+    return _backend
+
+
+def check_throttle(*checks):
+    """
+    Take one token from each (rule, key) bucket, e.g.
+    check_throttle(('login_ip', ip), ('login_email', email)).
+    Returns 0 if the attempt may go ahead, otherwise the whole number
+    of seconds until it would be allowed. Empty keys are skipped.
+    """
+    retry_after = 0
+    for rule, key in checks:
+        if not key:
+            continue
+        capacity, rate = get_rule(rule)
+        allowed, wait = get_backend().take(f'{rule}:{key}', capacity, rate)
+
+        with _counters_lock:
+            _counters[(rule, 'allowed' if allowed else 'rejected')] += 1
+        if not allowed:
+            retry_after = max(retry_after, wait)
+
+    return int(retry_after) + 1 if retry_after else 0
+
+
+def get_throttle_counters():
+    """Throttle decisions so far in this process, {(rule, decision): count}."""
+    with _counters_lock:
+        return dict(_counters)
@@ -1,22 +1,26 @@
-import sqlite3
-from utils.init_db import db_name
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils.init_db import db_connection
+from utils.pagination import keyset_query, keyset_page
+from utils.statistics import get_counters
 from models.users import User
 
-def get_users_overview():
-    """Get users overview statistics."""
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
+# Optional cross-request cache of user rows, off unless USER_CACHE_TTL > 0.
+# Each worker has its own copy, so the TTL bounds how long a change made
+# through another worker (e.g. deactivation) can go unnoticed.
+USER_CACHE_MAX_SIZE = 1024
 
-    cursor.execute("SELECT COUNT(*) FROM users")
-    total_users = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 1")
-    active_users = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = 0")
-    inactive_users = cursor.fetchone()[0]
+_user_cache = OrderedDict()
+_user_cache_lock = threading.Lock()
 
-    conn.close()
+def get_users_overview():
+    """Get users overview statistics."""
+    counters = get_counters('users', 'active_users')
+    total_users = counters['users']
+    active_users = counters['active_users']
+    inactive_users = total_users - active_users
 
     return [
         {
@@ -38,26 +42,25 @@ def get_users_overview():
 
 
 def get_all_users():
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT 
-            u.id, 
-            u.employee_id, 
-            u.email, 
-            u.created_at, 
-            u.is_active,
-            e.first_name, 
-            e.last_name, 
-            e.role
-        FROM users AS u
-        JOIN employee AS e ON u.employee_id = e.employee_id
-        ORDER BY u.created_at DESC
-    """)
+    with db_connection() as conn:
+        cursor = conn.cursor()
 
-    rows = cursor.fetchall()
-    conn.close()
+        cursor.execute("""
+            SELECT
+                u.id,
+                u.employee_id,
+                u.email,
+                u.created_at,
+                u.is_active,
+                e.first_name,
+                e.last_name,
+                e.role
+            FROM users AS u
+            JOIN employee AS e ON u.employee_id = e.employee_id
+            ORDER BY u.created_at DESC
+        """)
+
+        rows = cursor.fetchall()
 
     users = []
 
@@ -80,33 +83,31 @@ def get_users_paginated(page=1, per_page=10):
     Fetch users with pagination.
     Returns (users_list, total_pages).
     """
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
+    total_users = get_counters('users')['users']
 
-    cursor.execute("SELECT COUNT(*) FROM users")
-    total_users = cursor.fetchone()[0]
+    with db_connection() as conn:
+        cursor = conn.cursor()
 
-    # Calculate LIMIT / OFFSET
-    offset = (page - 1) * per_page
+        # Calculate LIMIT / OFFSET
+        offset = (page - 1) * per_page
 
-    cursor.execute("""
-        SELECT 
-            u.id, 
-            u.employee_id, 
-            u.email, 
-            u.created_at, 
-            u.is_active,
-            e.first_name, 
-            e.last_name, 
-            e.role
-        FROM users AS u
-        JOIN employee AS e ON u.employee_id = e.employee_id
-        ORDER BY u.created_at DESC
-        LIMIT ? OFFSET ?
-    """, (per_page, offset))
+        cursor.execute("""
+            SELECT
+                u.id,
+                u.employee_id,
+                u.email,
+                u.created_at,
+                u.is_active,
+                e.first_name,
+                e.last_name,
+                e.role
+            FROM users AS u
+            JOIN employee AS e ON u.employee_id = e.employee_id
+            ORDER BY u.created_at DESC, u.id DESC
+            LIMIT ? OFFSET ?
+        """, (per_page, offset))
 
-    rows = cursor.fetchall()
-    conn.close()
+        rows = cursor.fetchall()
 
     users = []
 
@@ -131,67 +132,176 @@ def get_users_paginated(page=1, per_page=10):
     return users, total_pages
 
 
-def get_user_count():
-    """Get total number of users."""
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
+def get_users_by_cursor(cursor=None, per_page=10):
+    """
+    Fetch users with keyset pagination on (created_at, id).
+    Returns (users_list, next_cursor, prev_cursor, total_users).
+    """
+    base_sql = """
+        SELECT
+            u.id,
+            u.employee_id,
+            u.email,
+            u.created_at,
+            u.is_active,
+            e.first_name,
+            e.last_name,
+            e.role
+        FROM users AS u
+        JOIN employee AS e ON u.employee_id = e.employee_id
+    """
+    sql, params, direction = keyset_query(base_sql, cursor, per_page, prefix='u.')
+
+    with db_connection() as conn:
+        db_cursor = conn.cursor()
+
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    total_users = get_counters('users')['users']
+
+    rows, next_cursor, prev_cursor = keyset_page(
+        rows, cursor, direction, per_page, key=lambda r: (r[3], r[0])
+    )
+
+    users = []
+
+    for r in rows:
+        users.append({
+            "id": r[0],
+            "employee_id": r[1],
+            "email": r[2],
+            "created_at": r[3],
+            "is_active": bool(r[4]),
+            "first_name": r[5],
+            "last_name": r[6],
+            "role": r[7]
+        })
+
+    return users, next_cursor, prev_cursor, total_users
 
-    cursor.execute("SELECT COUNT(*) FROM users")
-    count = cursor.fetchone()[0]
 
-    conn.close()
-    return count
+def get_user_count():
+    """Get total number of users, from the trigger-maintained table_counters."""
+    return get_counters('users')['users']
 
 def find_user_by_email(email):
     """
     Fetch a user from the database using their email address.
     """
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
-
-    cursor.execute('''
-    SELECT u.id, u.employee_id, u.email, e.first_name, e.last_name, u.password_hash, u.is_active
-    FROM users u
-    JOIN employee e ON u.employee_id = e.employee_id
-    WHERE u.email = ?
-    ''', (email,))
-    row = cursor.fetchone() 
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+        SELECT u.id, u.employee_id, u.email, e.first_name, e.last_name, u.password_hash, u.is_active, e.role
+        FROM users u
+        JOIN employee e ON u.employee_id = e.employee_id
+        WHERE u.email = ?
+        ''', (email,))
+        row = cursor.fetchone()
 
     if row:
-        return User(*row)  
-    return None 
+        return User(*row)
+    return None
+
+def get_user_by_id(user_id):
+    """
+    Fetch a user and their role in a single query.
+    Served from the optional USER_CACHE_TTL cache when it is enabled.
+    """
+    ttl = float(os.environ.get('USER_CACHE_TTL', 0))
+    now = time.monotonic()
+
+    row = None
+    if ttl > 0:
+        with _user_cache_lock:
+            cached = _user_cache.get(user_id)
+            if cached and now - cached[1] < ttl:
+                _user_cache.move_to_end(user_id)
+                row = cached[0]
+
+    if row is None:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                SELECT
+                    u.id,
+                    u.employee_id,
+                    u.email,
+                    e.first_name,
+                    e.last_name,
+                    u.password_hash,
+                    u.is_active,
+                    e.role
+                FROM users u
+                JOIN employee e ON u.employee_id = e.employee_id
+                WHERE u.id = ?
+            ''', (user_id,))
+            row = cursor.fetchone()
+
+        if ttl > 0 and row:
+            with _user_cache_lock:
+                _user_cache[user_id] = (row, now)
+                _user_cache.move_to_end(user_id)
+                if len(_user_cache) > USER_CACHE_MAX_SIZE:
+                    _user_cache.popitem(last=False)
+
+    if row:
+        return User(*row)
+    return None
+
+def invalidate_user_cache(user_id):
+    """Drop a cached user after their account changes."""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
 
 def deactivate_user(user_id):
     """
     Deactivate a user by setting is_active to False.
     """
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
-
-    cursor.execute('''
-    UPDATE users
-    SET is_active = 0, updated_at = CURRENT_TIMESTAMP
-    WHERE id = ?
-    ''', (user_id,))
-    
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+        UPDATE users
+        SET is_active = 0, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        ''', (user_id,))
+
+        conn.commit()
+    invalidate_user_cache(user_id)
     return True
 
 def activate_user(user_id):
     """
     Activate a user by setting is_active to True.
     """
-    conn = sqlite3.connect(db_name())
-    cursor = conn.cursor()
-
-    cursor.execute('''
-    UPDATE users
-    SET is_active = 1, updated_at = CURRENT_TIMESTAMP
-    WHERE id = ?
-    ''', (user_id,))
-    
-    conn.commit()
-    conn.close()
-    return True
\ No newline at end of file
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+        UPDATE users
+        SET is_active = 1, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        ''', (user_id,))
+
+        conn.commit()
+    invalidate_user_cache(user_id)
+    return True
+
+def update_password_hash(user_id, password_hash):
+    """
+    Replace a user's stored password hash, e.g. after rehashing it with new parameters.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+        UPDATE users
+        SET password_hash = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        ''', (password_hash, user_id))
+
+        conn.commit()
+    invalidate_user_cache(user_id)
+    return True